@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from statistics import median
+
+import numpy as np
+import pandas as pd
+
+from scripts import pipeline, synthetic
+
+# Runs every pipeline step on synthetic ensembles in a scratch copy of the
+# backend layout and records per-step and per-phase timings as JSON.
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def prepare(workdir, sheets):
+    os.makedirs(os.path.join(workdir, pipeline.DATA), exist_ok=True)
+    synthetic.write_workbook(os.path.join(workdir, pipeline.DATA, "scenario_data.xlsx"), sheets)
+    shutil.copyfile(
+        os.path.join(REPO, pipeline.DATA, "country_region_map.csv"),
+        os.path.join(workdir, pipeline.DATA, "country_region_map.csv"),
+    )
+
+
+def clean(workdir):
+    # Cold start for every repeat: no snapshots, cube, manifests or outputs
+    for d in [pipeline.CACHE, pipeline.PUBLIC, pipeline.FRONTEND]:
+        shutil.rmtree(os.path.join(workdir, d), ignore_errors=True)
+
+
+def run_steps(plots=True):
+    steps = {}
+    for name in pipeline.topological_order(pipeline.STEPS):
+        step = pipeline.STEPS[name]
+        if step.get("kind") == "plot":
+            if not plots:
+                continue
+            # Render in-process so the plot phase is measured
+            step = dict(step, params=dict(step["params"], workers=1, force=True))
+        metrics = pipeline.run_step(name, step)
+        steps[name] = {key: metrics[key] for key in ["wall", "cpu", "max_rss_mb", "phases", "bytes_written"]}
+    return steps
+
+
+def summarize(repeats):
+    # Best and median wall time per step and phase across repeats
+    summary = {}
+    for name in repeats[0]:
+        walls = [r[name]["wall"] for r in repeats]
+        phases = {}
+        for phase in repeats[0][name]["phases"]:
+            times = [r[name]["phases"].get(phase, {}).get("wall", 0.0) for r in repeats]
+            phases[phase] = {"best": min(times), "median": median(times)}
+        summary[name] = {
+            "best": min(walls), "median": median(walls), "runs": [r[name] for r in repeats], "phases": phases,
+        }
+    return summary
+
+
+def benchmark(config, repeat=3, plots=True):
+    sheets = synthetic.ensemble(**config)
+    workdir = tempfile.mkdtemp(prefix="pipeline-bench-")
+    cwd = os.getcwd()
+    try:
+        start = time.perf_counter()
+        prepare(workdir, sheets)
+        generate = time.perf_counter() - start
+        os.chdir(workdir)
+        repeats = []
+        for _ in range(repeat):
+            clean(workdir)
+            repeats.append(run_steps(plots))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    steps = summarize(repeats)
+    return {
+        "config": dict(config, years=[config["years"].start, config["years"][-1], config["years"].step]),
+        "rows": {name: len(frame) for name, frame in sheets.items()},
+        "generate_s": generate,
+        "total_best_s": sum(s["best"] for s in steps.values()),
+        "steps": steps,
+    }
+
+
+def regressions(results, baseline, tolerance):
+    # Steps slower than the baseline's best time by more than `tolerance`×, matched by config
+    slower = []
+    previous = {json.dumps(r["config"], sort_keys=True): r for r in baseline["runs"]}
+    for run in results["runs"]:
+        before = previous.get(json.dumps(run["config"], sort_keys=True))
+        if before is None:
+            continue
+        for name, step in run["steps"].items():
+            if name in before["steps"] and step["best"] > tolerance * before["steps"][name]["best"]:
+                slower.append((run["config"], name, before["steps"][name]["best"], step["best"]))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline step on synthetic scenario ensembles.")
+    parser.add_argument("--models", type=int, default=21, help="Number of models.")
+    parser.add_argument("--scenarios", type=int, default=4, help="Scenarios per model.")
+    parser.add_argument("--regions", type=int, default=6, help="Regions per scenario (World first).")
+    parser.add_argument("--first-year", type=int, default=2005)
+    parser.add_argument("--last-year", type=int, default=2100)
+    parser.add_argument("--year-step", type=int, default=5)
+    parser.add_argument("--missing", type=float, default=0.1, help="Share of year cells left unreported.")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1], help="Multiply scenarios per model; one run per value.")
+    parser.add_argument("--repeat", type=int, default=3, help="Cold runs per configuration.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-plots", action="store_true", help="Skip the diagnostic figure steps.")
+    parser.add_argument("--label", default="default", help="Name for this engine/branch in the results.")
+    parser.add_argument("--output", default=f"{pipeline.CACHE}benchmark_results.json")
+    parser.add_argument("--baseline", help="Earlier results file to compare against.")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Slowdown factor reported as a regression.")
+    args = parser.parse_args()
+
+    results = {
+        "label": args.label,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "runs": [],
+    }
+
+    for scale in args.scale:
+        config = {
+            "models": args.models,
+            "scenarios": args.scenarios * scale,
+            "regions": args.regions,
+            "years": range(args.first_year, args.last_year + 1, args.year_step),
+            "missing": args.missing,
+            "seed": args.seed,
+        }
+        print(f"🧪 {args.models} models × {config['scenarios']} scenarios × {args.regions} regions "
+              f"({args.repeat} run(s))...")
+        run = benchmark(config, repeat=args.repeat, plots=not args.no_plots)
+        results["runs"].append(run)
+        for name, step in run["steps"].items():
+            phases = ", ".join(f"{p} {t['best']:.2f}s" for p, t in step["phases"].items())
+            print(f"   {name:<12} {step['best']:8.2f}s" + (f"  ({phases})" if phases else ""))
+        print(f"   {'total':<12} {run['total_best_s']:8.2f}s")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Benchmark results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f), args.tolerance)
+        for config, name, before, after in slower:
+            print(f"⚠️ {name} slower at {config['scenarios']} scenarios/model: {before:.2f}s → {after:.2f}s")
+        if slower:
+            sys.exit(1)
+        print("✅ No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from scripts import ingest, pipeline
+from scripts import step1_filter_beccs as step1
+from scripts import step2_clean_electricity as step2
+from scripts import step3_standardize_timeseries as step3
+from scripts import step5_aggregate_outputs as step5
+from scripts.sketch import grouped_sketches, merge_grouped, summarize
+
+# Exactness check for the sketched step 5 summaries: builds the two step 5 tables
+# from the workbook, summarizes them with quantile sketches (also merged from
+# per-scenario partitions) and compares every statistic with pandas' exact groupby.
+# Groups whose sketches never compacted must match exactly (means to rounding, as
+# the sums run in a different order); the others must keep each quantile within the
+# sketch's normalized rank error bound.
+TABLES = {
+    "share": (["Scenario_Type", "Region", "Year"], ["Gas_Share", "Electricity|Gas"], ["count", "median"], (0.25, 0.75)),
+    "metrics": (["Scenario_Type", "Region"], ["Gas_2030", "Pct_Drop", "Gas_Share_2030"],
+                ["count", "min", "mean", "median", "max"], ()),
+}
+
+
+def load(workbook=ingest.workbook_path, threshold=3000):
+    beccs = ingest.read_sheet("beccs_deployment", workbook)
+    electricity = ingest.read_sheet("electricity_data", workbook)
+    _, _, cube = step3.standardize(step3.prepare_long(step2.to_long(electricity)))
+    cube.with_scenario_types(step1.classify(beccs, threshold))
+    return {
+        "share": step5.gas_share_pivot(cube),
+        "metrics": step5.metrics_table(cube, step5.scenario_metrics(cube)),
+    }
+
+
+def sketch(df, keys, metrics, error, partitions):
+    # Sketch each partition of scenarios separately, then merge
+    part = pd.factorize(df["Scenario_ID"])[0] % partitions
+    return merge_grouped(grouped_sketches(df.loc[part == p, keys], df.loc[part == p, metrics], error)
+                         for p in range(partitions))
+
+
+def rank_errors(values, estimates, quantiles):
+    # Normalized distance between each quantile's target rank and the ranks its estimate spans
+    x = np.sort(values[~np.isnan(values)])
+    n = len(x)
+    errors = []
+    for q, v in zip(quantiles, estimates):
+        lo, hi = np.searchsorted(x, v, side="left"), np.searchsorted(x, v, side="right")
+        target = q * (n - 1)
+        errors.append(max(0.0, lo - target, target - (hi - 1)) / n)
+    return errors
+
+
+def check(df, keys, metrics, stats, quantiles, error, partitions):
+    groups = sketch(df, keys, metrics, error, partitions)
+    summary = summarize(groups, keys, metrics, stats, quantiles)
+    grouped = df.groupby(keys, observed=True, sort=True)
+    report = {"groups": len(groups), "compacted": 0, "mismatches": 0, "max_rank_error": 0.0, "bound": 0.0,
+              "max_mean_rel_diff": 0.0}
+    exact = {
+        "count": grouped[metrics].count(), "min": grouped[metrics].min(), "max": grouped[metrics].max(),
+        "mean": grouped[metrics].mean(), "median": grouped[metrics].median(),
+        **{f"q{int(round(q * 100))}": grouped[metrics].quantile(q) for q in quantiles},
+    }
+    for key, sketches in groups.items():
+        label = key if len(keys) > 1 else key[0]
+        for metric, s in sketches.items():
+            report["compacted"] += s.compacted
+            report["bound"] = max(report["bound"], s.error)
+            for stat in list(stats) + [f"q{int(round(q * 100))}" for q in quantiles]:
+                got, want = summary.loc[label, (metric, stat)], exact[stat].loc[label, metric]
+                if stat == "mean":
+                    # pandas and step 5 (and merged partial sums) add the values in different orders
+                    if want:
+                        report["max_mean_rel_diff"] = max(report["max_mean_rel_diff"], abs(got / want - 1))
+                    continue
+                if s.compacted and stat in ["median"] + [f"q{int(round(q * 100))}" for q in quantiles]:
+                    continue
+                if not (got == want or (pd.isna(got) and pd.isna(want))):
+                    report["mismatches"] += 1
+            if s.compacted:
+                values = grouped.get_group(label)[metric].to_numpy(dtype=float)
+                qs = [0.5] + list(quantiles)
+                estimates = [s.median()] + [s.quantile(q) for q in quantiles]
+                report["max_rank_error"] = max([report["max_rank_error"]] + rank_errors(values, estimates, qs))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check sketched step 5 summaries against pandas' exact quantiles.")
+    parser.add_argument("--error", type=float, nargs="+", default=[0.01, 0.05, 0.1],
+                        help="Normalized rank errors to configure the sketches with.")
+    parser.add_argument("--partitions", type=int, nargs="+", default=[1, 4],
+                        help="Numbers of scenario partitions to sketch separately and merge.")
+    parser.add_argument("--workbook", default=ingest.workbook_path)
+    args = parser.parse_args()
+
+    tables = load(args.workbook, pipeline.STEPS["step1"]["params"]["threshold"])
+    failed = False
+    for error in args.error:
+        for partitions in args.partitions:
+            for name, (keys, metrics, stats, quantiles) in TABLES.items():
+                r = check(tables[name], keys, metrics, stats, quantiles, error, partitions)
+                ok = not r["mismatches"] and r["max_rank_error"] <= r["bound"] and r["max_mean_rel_diff"] < 1e-12
+                failed |= not ok
+                print(f"{'✅' if ok else '❌'} error={error:g} partitions={partitions} {name}: "
+                      f"{r['groups']} group(s), {r['compacted']} sketch(es) compacted, "
+                      f"{r['mismatches']} mismatch(es) with pandas, "
+                      f"max rank error {r['max_rank_error']:.2%} (bound {r['bound']:.2%})"
+                      + (f", mean rel. diff {r['max_mean_rel_diff']:.1e}" if "mean" in stats else ""))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
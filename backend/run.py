@@ -1,102 +1,153 @@
+import argparse
 import os
-from pathlib import Path
+import subprocess
+import sys
+import time
 
-def file_missing(path):
-    return not Path(path).exists()
+from scripts import api, pipeline
 
-def main():
-    print("🚦 Running backend pipeline...\n")
+def file_states(paths):
+    return {p: (os.stat(p).st_mtime_ns, os.stat(p).st_size) if os.path.exists(p) else None for p in paths}
 
-    # Step 1: Tagging BECCS Scenarios
-    try:
-        from scripts import step1_filter_beccs
-        step1_out = "backend/public_data/step1_scenario_type.csv"
-        if file_missing(step1_out):
-            print("▶️ Step 1: Tagging BECCS Scenarios...")
-            step1_filter_beccs.main()
-        else:
-            print(f"⏭️ Step 1 skipped – {step1_out} already exists.")
-    except ImportError:
-        print("⏭️ Step 1 skipped – script not yet available.")
+def watch(args):
+    # Poll the pipeline's source files and rebuild on change. Each build runs in a
+    # fresh interpreter so edited step scripts are picked up; the manifest then
+    # reruns only the affected steps. Data outputs are refreshed first, figures after.
+    # Steps 3-5 recompute only the changed scenarios (--incremental) unless
+    # --full-rebuild is given or --out-of-core, which cannot track them, is.
+    incremental = not (args.full_rebuild or args.out_of_core)
+    steps = pipeline.with_sources(args.sources) if args.sources else pipeline.STEPS
+    if incremental:
+        steps = pipeline.with_params(pipeline.INCREMENTAL, steps)
+    if args.sketch_error:
+        steps = pipeline.with_params(pipeline.sketch_params(args.sketch_error), steps)
+    if args.shard_workers:
+        steps = pipeline.with_params(pipeline.shard_params(args.shard_workers, args.shard_by), steps)
+    if args.out_of_core:
+        steps = pipeline.out_of_core_steps(steps)
+    elif args.stream:
+        steps = pipeline.streaming_steps(steps)
+    paths = pipeline.watched_files(steps)
+    # Source directories too, so workbooks added to them trigger a rebuild
+    paths += [s for s in args.sources or [] if os.path.isdir(s)]
+    build = [sys.executable, os.path.abspath(__file__), "--workers", str(args.workers)]
+    if args.stream:
+        build.append("--stream")
+    if args.sources:
+        build += ["--sources"] + args.sources
+    if incremental:
+        build.append("--incremental")
+    if args.out_of_core:
+        build.append("--out-of-core")
+    if args.sketch_error:
+        build += ["--sketch-error", str(args.sketch_error)]
+    if args.shard_workers:
+        build += ["--shard-workers", str(args.shard_workers), "--shard-by", args.shard_by]
 
-    # Step 2: Cleaning Electricity Data
-    try:
-        from scripts import step2_clean_electricity
-        step2_out = "backend/public_data/step2_electricity_long.csv"
-        if file_missing(step2_out):
-            print("▶️ Step 2: Cleaning Electricity Data...")
-            step2_clean_electricity.main()
-        else:
-            print(f"⏭️ Step 2 skipped – {step2_out} already exists.")
-    except ImportError:
-        print("⏭️ Step 2 skipped – script not yet available.")
+    def rebuild():
+        subprocess.run(build + ["--no-plots"])
+        if not args.no_plots:
+            print("\n📊 Refreshing diagnostic figures...")
+            subprocess.run(build)
 
-    # Step 3: Standardizing Time Series
+    state = file_states(paths)
+    rebuild()
+    print(f"\n👀 Watching {len(paths)} file(s) for changes (Ctrl+C to stop)...")
     try:
-        from scripts import step3_standardize_timeseries
-        step3_outs = [
-            "backend/public_data/step3_standardized.csv",
-            "backend/public_data/step3_modified_scenarios.csv"
-        ]
-        if any(file_missing(p) for p in step3_outs):
-            print("▶️ Step 3: Standardizing Time Series...")
-            step3_standardize_timeseries.main()
-        else:
-            print("⏭️ Step 3 skipped – all outputs already exist.")
-    except Exception as e:
-        print(f"❌ Step 3 failed – {e}")
+        while True:
+            time.sleep(args.interval)
+            current = file_states(paths)
+            if current == state:
+                continue
+            # Wait until the files stop changing (editors and Excel save in several writes)
+            while True:
+                time.sleep(args.interval)
+                settled = file_states(paths)
+                if settled == current:
+                    break
+                current = settled
+            changed = [p for p in paths if current[p] != state[p]]
+            state = current
+            print(f"\n🔁 Changed: {', '.join(changed)}")
+            rebuild()
+            print(f"\n👀 Watching {len(paths)} file(s) for changes (Ctrl+C to stop)...")
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching.")
 
-    # Step 4: Calculating Indicators
-    try:
-        from scripts import step4_calculate_indicators
-        step4_outs = [
-            "backend/public_data/step4_metrics.csv"
-        ]
-        if any(file_missing(p) for p in step4_outs):
-            print("▶️ Step 4: Calculating Indicators...")
-            step4_calculate_indicators.main()
-        else:
-            print("⏭️ Step 4 skipped – all outputs already exist.")
-    except ImportError:
-        print("⏭️ Step 4 skipped – script not yet available.")
+def main():
+    parser = argparse.ArgumentParser(description="Run the backend pipeline, rerunning only steps whose inputs, parameters or code changed.")
+    parser.add_argument("--force", action="store_true", help="Rerun every step regardless of the manifest.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which steps would run and why.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of steps to run in parallel (1 runs serially in-process).")
+    parser.add_argument("--no-plots", action="store_true", help="Skip the diagnostic figure steps.")
+    parser.add_argument("--profile", choices=list(pipeline.STEPS), help="Write a cProfile dump for this step.")
+    parser.add_argument("--in-memory", action="store_true", help="Hand data between steps in one process, skipping the manifest and the figures; the step 1-4 intermediates on disk are left as they were (stale) unless --persist is given.")
+    parser.add_argument("--persist", action="store_true", help="With --in-memory, also write the step 1-4 intermediates and the SQLite store.")
+    parser.add_argument("--trace-memory", action="store_true", help="Record each step's peak allocations with tracemalloc (slower).")
+    parser.add_argument("--stream", action="store_true", help="Stream the workbook row by row in steps 1-2 instead of loading whole sheets (bounded memory).")
+    parser.add_argument("--out-of-core", action="store_true", help="Stream ingestion and run steps 2-4 one Model partition at a time (bounded memory for steps 1-4 only: steps 5-6 still load the whole standardized cube/table; no figures).")
+    parser.add_argument("--incremental", action="store_true", help="Recompute steps 3-5 only for scenarios added, changed or removed since the last run.")
+    parser.add_argument("--sketch-error", type=float, metavar="EPS", help="Summarize step 5 from mergeable quantile sketches with this normalized rank error (e.g. 0.01); exact while groups fit the sketch.")
+    parser.add_argument("--shard-workers", type=int, metavar="N", help="Split the per-region work of steps 3-5 across N processes (outputs unchanged).")
+    parser.add_argument("--shard-by", choices=["region", "region_type"], default="region", help="Step 5 shard key with --shard-workers.")
+    parser.add_argument("--sources", nargs="+", help="Workbooks/CSVs or directories of them to merge in step 0, in priority order.")
+    parser.add_argument("--watch", action="store_true", help="Keep running and rebuild affected steps whenever data or scripts change; steps 3-5 redo only the changed scenarios, as with --incremental.")
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between checks in --watch mode.")
+    parser.add_argument("--full-rebuild", action="store_true", help="In --watch mode, rerun steps 3-5 over every scenario instead of only the changed ones (the default unless --out-of-core).")
+    args = parser.parse_args()
+    if args.in_memory:
+        ignored = [flag for flag, on in [
+            ("--incremental", args.incremental), ("--stream", args.stream), ("--out-of-core", args.out_of_core),
+            ("--sources", args.sources), ("--no-plots", args.no_plots), ("--dry-run", args.dry_run),
+            ("--profile", args.profile), ("--trace-memory", args.trace_memory), ("--watch", args.watch),
+        ] if on]
+        if ignored:
+            parser.error(f"--in-memory always runs steps 1-6 in full from the bundled workbook, without figures; "
+                         f"it cannot be combined with {', '.join(ignored)}")
+    elif args.persist:
+        parser.error("--persist only applies to --in-memory runs")
+    if args.sources and (args.stream or args.out_of_core):
+        parser.error("--sources merges snapshots in step 0; --stream and --out-of-core read a single workbook")
+    if args.full_rebuild and (not args.watch or args.incremental):
+        parser.error("--full-rebuild only applies to --watch, without --incremental")
+    if args.out_of_core and args.incremental:
+        parser.error("--incremental keeps the whole ensemble's series in its cache; it cannot be combined with --out-of-core")
 
-    # Step 5: Aggregating Outputs
-    try:
-        from scripts import step5_aggregate_outputs
-        step5_outs = [
-            "backend/public_data/step5_region_summary.json",
-            "backend/public_data/step5_benchmark_stats.json",
-            "backend/public_data/step5_scenario_gas_stats.csv",
-            "backend/public_data/step5_gas_share_summary.json",
-            "backend/public_data/step5_gas_share_paths.json",
-            "backend/public_data/step5_gas_timeseries_summary.json"
-        ]
-        if any(file_missing(p) for p in step5_outs):
-            print("▶️ Step 5: Aggregating Outputs...")
-            step5_aggregate_outputs.main()
-        else:
-            print("⏭️ Step 5 skipped – all outputs already exist.")
-    except ImportError:
-        print("⏭️ Step 5 skipped – script not yet available.")
+    if args.sketch_error is not None and not 0 < args.sketch_error < 1:
+        parser.error("--sketch-error is a fraction of the ranks, between 0 and 1")
 
-    # Step 6: Exporting Final JSONs
-    try:
-        from scripts import step6_export_json
-        step6_outs = [
-            "backend/public_data/step6_scenario_timeseries.json",
-            "backend/public_data/step6_scenario_table.json",
-            "backend/public_data/step6_map_data.json",
-            "backend/public_data/step6_country_region_map.json"
-        ]
-        if any(file_missing(p) for p in step6_outs):
-            print("▶️ Step 6: Exporting Final JSONs...")
-            step6_export_json.main()
-        else:
-            print("⏭️ Step 6 skipped – all outputs already exist.")
-    except ImportError:
-        print("⏭️ Step 6 skipped – script not yet available.")
+    if args.watch:
+        return watch(args)
+
+    print("🚦 Running backend pipeline...\n")
+
+    if args.in_memory:
+        params = {name: step["params"] for name, step in pipeline.STEPS.items()}
+        result = api.run(
+            threshold=params["step1"]["threshold"],
+            thresholds=params["step5"]["thresholds"],
+            paths_layout=params["step5"]["paths_layout"],
+            paths_precision=params["step5"]["paths_precision"],
+            persist=args.persist,
+            shard_workers=args.shard_workers or 1,
+            shard_by=args.shard_by,
+            **({"summary": "sketch", "sketch_error": args.sketch_error} if args.sketch_error else {}),
+        )
+        timings = ", ".join(f"{name} {t:.2f}s" for name, t in result["timings"].items())
+        print(f"\n✅ In-memory pipeline completed ({timings}).")
+        return
+
+    failed = pipeline.run(
+        force=args.force, dry_run=args.dry_run, workers=args.workers, plots=not args.no_plots,
+        profile=args.profile, trace_memory=args.trace_memory, streaming=args.stream, sources=args.sources, incremental=args.incremental,
+        out_of_core=args.out_of_core, sketch_error=args.sketch_error,
+        shard_workers=args.shard_workers, shard_by=args.shard_by,
+    )
 
-    print("\n✅ Pipeline completed.")
+    if failed:
+        print(f"\n⚠️ Pipeline completed with failures: {', '.join(sorted(failed))}")
+    else:
+        print("\n✅ Pipeline completed.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,65 @@
+import time
+
+from scripts import ingest
+from scripts import step1_filter_beccs as step1
+from scripts import step2_clean_electricity as step2
+from scripts import step3_standardize_timeseries as step3
+from scripts import step4_calculate_indicators as step4
+from scripts import step5_aggregate_outputs as step5
+from scripts import step6_export_json as step6
+from scripts import step7_sqlite_store as step7
+from scripts.instrument import phase
+
+# In-memory pipeline: the steps hand their typed DataFrames and the scenario cube
+# straight to each other in one process instead of writing step1–step4 CSVs and
+# parsing them again. Only the published step 5/6 outputs are written unless
+# persist=True, which also saves every intermediate the file-based pipeline does
+# and loads them into the SQLite store.
+
+
+def run(workbook=ingest.workbook_path, threshold=3000, thresholds=None,
+        paths_layout="records", paths_precision=2, persist=False, publish=True, summary="exact", sketch_error=0.01,
+        shard_workers=1, shard_by="region"):
+    timings = {}
+
+    def timed(name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        out = fn(*args, **kwargs)
+        timings[name] = time.perf_counter() - start
+        return out
+
+    beccs, electricity = timed("step0", lambda: (
+        ingest.read_sheet("beccs_deployment", workbook), ingest.read_sheet("electricity_data", workbook)
+    ))
+
+    tags = timed("step1", step1.classify, beccs, threshold)
+    long_df = timed("step2", step2.to_long, electricity)
+    with phase("interpolate"):
+        standardized, modified_ids, cube = timed("step3", step3.standardize, step3.prepare_long(long_df),
+                                                 workers=shard_workers)
+    metrics = timed("step4", step4.indicators, cube, workers=shard_workers)
+    cube.with_scenario_types(tags)
+
+    if persist:
+        step1.save(tags)
+        step2.save(long_df)
+        step3.save(standardized, modified_ids, cube)
+        step4.save(metrics)
+
+    if publish:
+        timed("step5", step5.main, thresholds=thresholds, plots=False,
+              paths_layout=paths_layout, paths_precision=paths_precision, cube=cube,
+              summary=summary, sketch_error=sketch_error, shard_workers=shard_workers, shard_by=shard_by)
+        timed("step6", step6.main, standardized=standardized)
+        if persist:
+            timed("step7", step7.main)
+
+    return {
+        "scenario_type": tags,
+        "electricity_long": long_df,
+        "standardized": standardized,
+        "modified_scenarios": modified_ids,
+        "cube": cube,
+        "metrics": metrics,
+        "timings": timings,
+    }
@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Dense scenario × region × variable × year array shared by steps 3–5.
+# Axis labels are stored once and referenced by integer code, so the per-step
+# reshaping of the long table (pivots, boolean filters on Scenario_Type/Region)
+# becomes indexing and reductions over axes.
+cube_path = "backend/cache/step3_cube.npz"
+
+
+class ScenarioCube:
+    def __init__(self, values, present, interpolated, scenarios, regions, variables, years):
+        self.values = values              # float64 (S, R, V, Y); NaN where nothing was reported
+        self.present = present            # bool (S, R, V); series exists in the standardized table
+        self.interpolated = interpolated  # bool (S, R, V); series needed gap filling in step 3
+        self.scenarios = np.asarray(scenarios, dtype=object)
+        self.regions = np.asarray(regions, dtype=object)
+        self.variables = np.asarray(variables, dtype=object)
+        self.years = np.asarray(years, dtype="int64")
+        # Filled in by with_scenario_types(); -1 marks untagged scenarios
+        self.types = np.asarray([], dtype=object)
+        self.scenario_type = np.full(len(self.scenarios), -1, dtype="int8")
+
+    @classmethod
+    def from_series(cls, meta, values, interpolated, years):
+        # meta: one row per series (Scenario_ID, Region, Variable_standardized, ...),
+        # aligned with the rows of the series × year matrix `values`
+        keep = meta["Variable_standardized"].notna().to_numpy()
+        meta = meta[keep]
+        s, scenarios = pd.factorize(meta["Scenario_ID"], sort=True)
+        r, regions = pd.factorize(meta["Region"], sort=True)
+        v, variables = pd.factorize(meta["Variable_standardized"], sort=True)
+
+        # Several raw variables mapping to one standardized name are averaged,
+        # matching the pivot_table mean step 5 applied to the long table
+        shape = (len(scenarios), len(regions), len(variables), len(years))
+        sums = np.zeros(shape)
+        counts = np.zeros(shape)
+        rows = values[keep]
+        np.add.at(sums, (s, r, v), np.nan_to_num(rows))
+        np.add.at(counts, (s, r, v), ~np.isnan(rows))
+        with np.errstate(invalid="ignore"):
+            cube = np.where(counts > 0, sums / counts, np.nan)
+
+        present = np.zeros(shape[:3], dtype=bool)
+        present[s, r, v] = True
+        flags = np.zeros(shape[:3], dtype=bool)
+        np.logical_or.at(flags, (s, r, v), interpolated[keep])
+        return cls(cube, present, flags, scenarios, regions, variables, years)
+
+    @classmethod
+    def concat(cls, cubes):
+        # Stack cubes over disjoint scenario sets, in the given order, on the union of
+        # their (sorted) region and variable axes
+        regions = sorted(set().union(*(c.regions.tolist() for c in cubes)))
+        variables = sorted(set().union(*(c.variables.tolist() for c in cubes)))
+        years = cubes[0].years
+        shape = (sum(len(c.scenarios) for c in cubes), len(regions), len(variables), len(years))
+        values = np.full(shape, np.nan)
+        present = np.zeros(shape[:3], dtype=bool)
+        interpolated = np.zeros(shape[:3], dtype=bool)
+        start = 0
+        for c in cubes:
+            at = np.ix_(np.arange(start, start + len(c.scenarios)),
+                        pd.Index(regions).get_indexer(c.regions), pd.Index(variables).get_indexer(c.variables))
+            values[at] = c.values
+            present[at] = c.present
+            interpolated[at] = c.interpolated
+            start += len(c.scenarios)
+        return cls(values, present, interpolated, np.concatenate([c.scenarios for c in cubes]),
+                   regions, variables, years)
+
+    @classmethod
+    def load(cls, path=cube_path):
+        with np.load(path, allow_pickle=False) as data:
+            cube = cls(
+                data["values"], data["present"], data["interpolated"],
+                data["scenarios"], data["regions"], data["variables"], data["years"],
+            )
+            if "types" in data:
+                cube.types = data["types"].astype(object)
+                cube.scenario_type = data["scenario_type"]
+        return cube
+
+    def save(self, path=cube_path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            values=self.values, present=self.present, interpolated=self.interpolated,
+            scenarios=self.scenarios.astype(str), regions=self.regions.astype(str),
+            variables=self.variables.astype(str), years=self.years,
+            types=self.types.astype(str), scenario_type=self.scenario_type,
+        )
+        os.replace(tmp, path)
+
+    def with_scenario_types(self, df_type, column="BECCS_Type"):
+        # Attach the step 1 classification as an integer-coded scenario attribute
+        tagged = df_type.drop_duplicates("Scenario_ID").set_index("Scenario_ID")[column]
+        labels = tagged.reindex(self.scenarios)
+        codes, types = pd.factorize(labels, sort=True)
+        self.types = np.asarray(types, dtype=object)
+        self.scenario_type = codes.astype("int8")
+        return self
+
+    def subset(self, scenarios):
+        # The same cube restricted to the given scenarios (kept in cube order)
+        rows = np.isin(self.scenarios, list(scenarios))
+        cube = ScenarioCube(
+            self.values[rows], self.present[rows], self.interpolated[rows],
+            self.scenarios[rows], self.regions, self.variables, self.years,
+        )
+        cube.types = self.types
+        cube.scenario_type = self.scenario_type[rows]
+        return cube
+
+    def type_labels(self):
+        # Scenario type per scenario as labels, NaN where untagged
+        labels = np.full(len(self.scenarios), np.nan, dtype=object)
+        tagged = self.scenario_type >= 0
+        labels[tagged] = self.types[self.scenario_type[tagged]]
+        return labels
+
+    def code(self, axis, label):
+        labels = getattr(self, axis)
+        return int(np.flatnonzero(labels == label)[0])
+
+    def variable(self, name):
+        # (S, R, Y) slice and (S, R) presence mask for one standardized variable
+        if name not in set(self.variables):
+            shape = self.values.shape
+            return np.full(shape[:2] + shape[3:], np.nan), np.zeros(shape[:2], dtype=bool)
+        v = self.code("variables", name)
+        return self.values[:, :, v, :], self.present[:, :, v]
+
+    def at_year(self, name, year):
+        values, _ = self.variable(name)
+        return values[..., self.code("years", year)]
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+# Compact in-memory layout for the long-format tables (step 2 onward). The string
+# dimensions repeated on every row are categoricals with sorted categories, so
+# sorting and grouping order match the plain strings, and years are int16.
+# Values stay float64: every published output is written at full precision.
+DIMENSIONS = [
+    "Scenario_ID", "Model", "Scenario", "Region", "Variable", "Unit",
+    "Variable_clean", "Variable_standardized", "Scenario_Type", "BECCS_Type",
+]
+CSV_DTYPES = {**{col: "category" for col in DIMENSIONS}, "Year": "int16"}
+
+
+def compact(df):
+    # Cast the dimension columns and Year in place; returns the frame for chaining
+    for col in df.columns:
+        if col in DIMENSIONS and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    if "Year" in df.columns and df["Year"].dtype != "int16" and len(df) \
+            and np.iinfo("int16").min <= df["Year"].min() and df["Year"].max() <= np.iinfo("int16").max:
+        df["Year"] = df["Year"].astype("int16")
+    return df
+
+
+def expanded(df):
+    # Plain object/int64 copy, for code relying on value-order semantics (seaborn)
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    if "Year" in df.columns:
+        df["Year"] = df["Year"].astype("int64")
+    return df
+
+
+def coded(codes, labels):
+    # Categorical column straight from integer codes into sorted unique labels (-1 → NaN)
+    return pd.Categorical.from_codes(np.asarray(codes), categories=pd.Index(labels, dtype=object))
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / (1 << 20)
@@ -0,0 +1,34 @@
+import hashlib
+import os
+
+# Data directories and file helpers shared by the orchestrator and the steps, kept
+# apart from pipeline.py so that steps don't import the orchestrator.
+DATA = "backend/data/"
+PUBLIC = "backend/public_data/"
+FRONTEND = "frontend/public/data/"
+CACHE = "backend/cache/"
+SOURCE_EXTENSIONS = (".xlsx", ".xlsm", ".csv")
+
+
+def source_files(sources):
+    # Expand directories into their workbooks/CSVs (sorted, skipping Excel lock files)
+    files = []
+    for src in sources:
+        if os.path.isdir(src):
+            files += sorted(
+                os.path.join(src, f) for f in os.listdir(src)
+                if f.lower().endswith(SOURCE_EXTENSIONS) and not f.startswith("~$")
+            )
+        else:
+            files.append(src)
+    return list(dict.fromkeys(os.path.normpath(f) for f in files))
+
+
+def file_hash(path):
+    if not os.path.exists(path):
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Scenario-level change tracking for incremental runs (run.py --incremental).
+# Step 3 hashes each Scenario_ID's rows of the long table and compares them with
+# its last run; the added, changed and removed IDs are written to delta_path.
+# Steps 4 and 5 keep their own per-scenario results and, when those were built
+# from the step 3 state the delta starts from, recompute only the delta.
+delta_path = "backend/cache/step3_delta.json"
+
+
+def scenario_hashes(df, key="Scenario_ID"):
+    # Scenario_ID → digest of its rows (all columns, in table order)
+    row_hash = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    codes, ids = pd.factorize(df[key])
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(ids) + 1))
+    hashes = row_hash[order]
+    return {
+        str(sid): hashlib.sha256(hashes[a:b].tobytes()).hexdigest()[:16]
+        for sid, a, b in zip(ids, bounds[:-1], bounds[1:])
+    }
+
+
+def token(hashes):
+    # Identifies one state of the whole ensemble
+    return hashlib.sha256(json.dumps(hashes, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def diff(old, new):
+    return {
+        "added": sorted(set(new) - set(old)),
+        "changed": sorted(s for s in set(new) & set(old) if new[s] != old[s]),
+        "removed": sorted(set(old) - set(new)),
+    }
+
+
+def load_state(path):
+    return pd.read_pickle(path) if os.path.exists(path) else None
+
+
+def save_state(state, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.to_pickle(state, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+
+def save_delta(delta, path=delta_path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(delta, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def discard_delta(path=delta_path):
+    # A full step 3 run leaves no delta, so later steps recompute in full next time
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def usable_delta(state, path=delta_path):
+    # The step 3 delta if `state` (a later step's cache) was built from the state it starts at
+    if state is None or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        delta = json.load(f)
+    if state.get("token") == delta["token"]:
+        # Already built from the current step 3 state
+        return {**delta, "full": False, "added": [], "changed": [], "removed": []}
+    if delta["full"] or delta["base"] is None or state.get("token") != delta["base"]:
+        return None
+    return delta
+
+
+def current_token(path=delta_path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)["token"]
+
+
+def describe(delta):
+    if delta is None or delta["full"]:
+        return "full recompute"
+    return (f"{len(delta['added'])} added, {len(delta['changed'])} changed, "
+            f"{len(delta['removed'])} removed scenario(s)")
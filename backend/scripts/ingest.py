@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from scripts.instrument import phase
+from scripts.files import file_hash, source_files
+
+# Parsing the workbook through openpyxl is the slowest part of a cold run, so every
+# sheet the pipeline needs is parsed in one pass and kept as a pickled DataFrame
+# snapshot. Snapshots are reused while the workbook's mtime/size (fast path) or
+# content hash still match.
+workbook_path = "backend/data/scenario_data.xlsx"
+cache_dir = "backend/cache/ingest/"
+merged_dir = f"{cache_dir}merged/"
+conflicts_path = f"{cache_dir}source_conflicts.csv"
+SHEETS = ["beccs_deployment", "electricity_data"]
+ID_COLUMNS = ["Model", "Scenario", "Region", "Variable", "Unit"]
+MERGE_KEY = ["Model", "Scenario", "Region", "Variable"]
+
+# Flat CSV exports hold every variable in one table; rows are routed to the
+# workbook sheet their (normalized) variable belongs to, others are ignored
+SHEET_VARIABLES = {
+    "beccs_deployment": ["carbon sequestration|ccs|biomass"],
+    "electricity_data": ["secondary energy|electricity", "secondary energy|electricity|gas"],
+}
+
+
+def snapshot_dir(path=workbook_path):
+    # Named after the file, plus a short hash of its path so same-named sources do not collide
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}-{hashlib.sha256(os.path.normpath(path).encode()).hexdigest()[:8]}")
+
+
+def sheet_path(sheet, path=workbook_path):
+    return os.path.join(snapshot_dir(path), f"{sheet}.pkl")
+
+
+def _load_index(path):
+    index_path = os.path.join(snapshot_dir(path), "index.json")
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def _save_index(path, index):
+    index_path = os.path.join(snapshot_dir(path), "index.json")
+    with open(f"{index_path}.tmp", "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(f"{index_path}.tmp", index_path)
+
+
+def snapshot(path=workbook_path, sheets=SHEETS):
+    # Make sure an up-to-date snapshot of every sheet exists; returns True if Excel was parsed
+    stat = os.stat(path)
+    index = _load_index(path)
+    cached = index is not None and set(sheets) <= set(index["sheets"]) and all(
+        os.path.exists(sheet_path(s, path)) for s in sheets
+    )
+
+    if cached and index["mtime_ns"] == stat.st_mtime_ns and index["size"] == stat.st_size:
+        return False
+
+    digest = file_hash(path)
+    if cached and index["sha256"] == digest:
+        # Touched but unchanged – refresh the fast-path key only
+        index.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        _save_index(path, index)
+        return False
+
+    with phase("ingest"):
+        frames = parse(path, sheets)
+    os.makedirs(snapshot_dir(path), exist_ok=True)
+    for sheet, frame in frames.items():
+        out = sheet_path(sheet, path)
+        frame.to_pickle(f"{out}.tmp")
+        os.replace(f"{out}.tmp", out)
+
+    _save_index(path, {
+        "workbook": path,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": digest,
+        "sheets": list(sheets),
+    })
+    return True
+
+
+def parse(path, sheets=SHEETS):
+    # {sheet: DataFrame} in the workbook's wide layout; sheets a source lacks come back empty
+    if path.lower().endswith(".csv"):
+        df = pd.read_csv(path, float_precision="round_trip")
+        df = df.rename(columns={c: int(c) for c in df.columns if str(c).strip().isdigit()})
+        variable = df["Variable"].str.strip().str.lower()
+        return {s: df[variable.isin(SHEET_VARIABLES[s])].reset_index(drop=True) for s in sheets}
+
+    # One workbook load for all sheets
+    with pd.ExcelFile(path) as xl:
+        present = [s for s in sheets if s in xl.sheet_names]
+        frames = pd.read_excel(xl, sheet_name=present) if present else {}
+    return {s: frames.get(s, pd.DataFrame()) for s in sheets}
+
+
+def read_sheet(sheet, path=workbook_path):
+    snapshot(path)
+    return pd.read_pickle(sheet_path(sheet, path))
+
+
+def merged_path(sheet):
+    return os.path.join(merged_dir, f"{sheet}.pkl")
+
+
+def merge(frames, sources):
+    # Stack one sheet from every source; a (Model, Scenario, Region, Variable) key is
+    # taken from its first row, in source priority order, and every later row holding
+    # the same key, from another source or repeated within one, is dropped and reported
+    tagged = [f.assign(_source=i) for i, f in enumerate(frames) if len(f)]
+    if not tagged:
+        return frames[0], []
+    combined = pd.concat(tagged, ignore_index=True)
+    years = sorted(c for c in combined.columns if isinstance(c, int))
+    if len(tagged) > 1:
+        # Sources may list their years in different orders; a single one keeps its own
+        combined = combined[[c for c in combined.columns if not isinstance(c, int)] + years]
+
+    repeated = combined.duplicated(MERGE_KEY, keep="first").to_numpy()
+    kept = combined[~repeated]
+    dropped = combined[repeated]
+
+    report = []
+    if len(dropped):
+        winners = kept.set_index(MERGE_KEY)
+        index = pd.MultiIndex.from_frame(dropped[MERGE_KEY])
+        theirs = winners[years].reindex(index).to_numpy(dtype=float)
+        ours = dropped[years].to_numpy(dtype=float)
+        differs = ~((ours == theirs) | (np.isnan(ours) & np.isnan(theirs)))
+        with np.errstate(invalid="ignore"):
+            gap = np.where(differs, np.abs(ours - theirs), np.nan)
+        kept_source = winners["_source"].reindex(index).to_numpy()
+        for i, key in enumerate(dropped[MERGE_KEY].itertuples(index=False)):
+            n_diff = int(differs[i].sum())
+            report.append({
+                **dict(zip(MERGE_KEY, key)),
+                "Kept_Source": sources[int(kept_source[i])],
+                "Dropped_Source": sources[int(dropped["_source"].iat[i])],
+                "Status": "conflict" if n_diff else "duplicate",
+                "Differing_Years": n_diff,
+                "Max_Abs_Diff": None if np.isnan(gap[i]).all() else float(np.nanmax(gap[i])),
+            })
+    return kept.drop(columns="_source").reset_index(drop=True), report
+
+
+def snapshot_sources(sources=None, sheets=SHEETS, workers=None):
+    # Snapshot every source file (in parallel, each only when it changed), then merge
+    # each sheet across sources; returns (files, parsed files, conflict rows)
+    files = source_files(sources or [workbook_path])
+    if not files:
+        raise FileNotFoundError(f"No workbooks or CSVs found in: {', '.join(sources)}")
+    workers = min(len(files), workers or os.cpu_count() or 1)
+    if workers > 1:
+        # Phases aren't collected in worker processes, so the pool is timed as a whole
+        with phase("ingest"), ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(snapshot, files, [sheets] * len(files)))
+    else:
+        parsed = [snapshot(f, sheets) for f in files]
+
+    os.makedirs(merged_dir, exist_ok=True)
+    conflicts = []
+    for sheet in sheets:
+        frame, report = merge([pd.read_pickle(sheet_path(sheet, f)) for f in files], files)
+        conflicts += [{"Sheet": sheet, **r} for r in report]
+        out = merged_path(sheet)
+        frame.to_pickle(f"{out}.tmp")
+        os.replace(f"{out}.tmp", out)
+
+    os.makedirs(os.path.dirname(conflicts_path), exist_ok=True)
+    columns = ["Sheet"] + MERGE_KEY + ["Kept_Source", "Dropped_Source", "Status", "Differing_Years", "Max_Abs_Diff"]
+    pd.DataFrame(conflicts, columns=columns).to_csv(conflicts_path, index=False)
+    return files, [f for f, p in zip(files, parsed) if p], conflicts
+
+
+def read_merged(sheet):
+    # The merged sheet step 0 wrote; merges the default workbook first if there is none yet
+    if not os.path.exists(merged_path(sheet)):
+        snapshot_sources()
+    return pd.read_pickle(merged_path(sheet))
+
+
+def _year(header):
+    # Year headers arrive as int (or integral float from some exporters)
+    if isinstance(header, (int, float)) and not isinstance(header, bool) and float(header).is_integer():
+        return int(header)
+    return None
+
+
+def iter_sheet(sheet, path=workbook_path, columns=ID_COLUMNS, years=None, chunk_rows=5000):
+    # Stream a sheet in openpyxl's read-only mode as DataFrames of at most chunk_rows
+    # rows, holding only the given id columns plus the year columns (all, or those in
+    # years). Cells are never held for more than one chunk, so memory does not grow
+    # with the size of the workbook.
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet].iter_rows(values_only=True)
+        header = next(rows, ())
+        missing = [c for c in columns if c not in header]
+        if missing:
+            raise ValueError(f"Sheet {sheet} has no column(s): {', '.join(map(str, missing))}")
+        year_cols = [(i, _year(h)) for i, h in enumerate(header)
+                     if _year(h) is not None and (years is None or _year(h) in years)]
+        idx = [header.index(c) for c in columns] + [i for i, _ in year_cols]
+        names = list(columns) + [y for _, y in year_cols]
+
+        def frame(buffer):
+            df = pd.DataFrame(buffer, columns=names)
+            year_names = names[len(columns):]
+            df[year_names] = df[year_names].apply(pd.to_numeric, errors="coerce").astype(float)
+            return df
+
+        buffer = []
+        for row in rows:
+            # Blank rows are skipped, as read_excel does
+            if all(v is None for v in row):
+                continue
+            buffer.append([row[i] if i < len(row) else None for i in idx])
+            if len(buffer) == chunk_rows:
+                yield frame(buffer)
+                buffer = []
+        if buffer:
+            yield frame(buffer)
+    finally:
+        wb.close()
+
+
+def main(sources=None):
+    files, parsed, conflicts = snapshot_sources(sources)
+    if parsed:
+        print(f"✅ Parsed {len(parsed)} of {len(files)} source(s) into {cache_dir}")
+    else:
+        print(f"✅ Snapshots of {len(files)} source(s) are current, parsing skipped.")
+    if len(files) > 1:
+        n_conflicts = sum(c["Status"] == "conflict" for c in conflicts)
+        print(f"✅ Merged into {merged_dir}: {len(conflicts)} overlapping row(s) dropped, "
+              f"{n_conflicts} with differing values (see {conflicts_path}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import cProfile
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Named sub-phases inside a step (ingest, interpolate, aggregate, serialize, plot).
+# While a collector is active, time spent in each phase accumulates under its name,
+# so a step's wall time can be broken down. Otherwise phase() only costs a list check.
+_collectors = []
+
+
+@contextmanager
+def collect():
+    phases = {}
+    _collectors.append(phases)
+    try:
+        yield phases
+    finally:
+        _collectors.pop()
+
+
+@contextmanager
+def phase(name):
+    if not _collectors:
+        yield
+        return
+    start, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        entry = _collectors[-1].setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+        entry["wall"] += time.perf_counter() - start
+        entry["cpu"] += time.process_time() - cpu
+        entry["calls"] += 1
+
+
+def max_rss_mb():
+    # High-water mark of the current process (not reset between steps run by the same process)
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+@contextmanager
+def measure(trace_memory=False, profile_path=None):
+    # Wall/CPU time, memory and phase breakdown of the enclosed block. tracemalloc gives
+    # the block's own peak of Python and NumPy allocations but slows it down, so it is opt-in.
+    metrics = {}
+    tracing = trace_memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    if trace_memory:
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile() if profile_path else None
+    start, cpu = time.perf_counter(), time.process_time()
+    with collect() as phases:
+        if profiler:
+            profiler.enable()
+        try:
+            yield metrics
+        finally:
+            if profiler:
+                profiler.disable()
+            metrics.update(
+                wall=time.perf_counter() - start,
+                cpu=time.process_time() - cpu,
+                max_rss_mb=max_rss_mb(),
+                phases=phases,
+            )
+            if trace_memory:
+                metrics["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / (1 << 20)
+            if tracing:
+                tracemalloc.stop()
+            if profiler:
+                os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+                profiler.dump_stats(profile_path)
+                metrics["profile"] = profile_path
+
+
+def row_count(path):
+    # Data rows in a CSV, counted from its newlines; None for other formats, which
+    # would have to be parsed (and held in memory) to count
+    if not path.endswith(".csv"):
+        return None
+    with open(path, "rb") as f:
+        lines = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+    return max(lines - 1, 0)
+
+
+def file_stats(paths):
+    return {
+        p: {"rows": row_count(p), "bytes": os.path.getsize(p)} if os.path.exists(p) else None
+        for p in paths
+    }
@@ -0,0 +1,537 @@
+import hashlib
+import importlib
+import importlib.util
+import inspect
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+
+from scripts import instrument
+from scripts import step6_export_json as step6
+from scripts.files import CACHE, DATA, FRONTEND, PUBLIC, file_hash, source_files
+
+# Declarative step graph: each step lists the files it reads and writes, the
+# script(s) whose source defines its behaviour and the parameters it is called with.
+# Dependencies between steps are derived from matching outputs to inputs.
+MANIFEST_PATH = f"{CACHE}pipeline_manifest.json"
+RUN_MANIFEST_PATH = "backend/run_manifest.json"
+PROFILES = f"{CACHE}profiles/"
+
+# Scenario databases merged by step 0, in priority order: workbooks/CSVs or
+# directories of them (run.py --sources overrides)
+SOURCES = [f"{DATA}scenario_data.xlsx"]
+
+STEPS = {
+    "step0": {
+        "label": "Ingesting Scenario Sources",
+        "module": "scripts.ingest",
+        "code": ["backend/scripts/files.py"],
+        "entry": "main",
+        "params": {"sources": SOURCES},
+        "inputs": source_files(SOURCES),
+        "outputs": [
+            f"{CACHE}ingest/merged/beccs_deployment.pkl",
+            f"{CACHE}ingest/merged/electricity_data.pkl",
+            f"{CACHE}ingest/source_conflicts.csv",
+        ],
+    },
+    "step1": {
+        "label": "Tagging BECCS Scenarios",
+        "module": "scripts.step1_filter_beccs",
+        "code": ["backend/scripts/ingest.py"],
+        "entry": "main",
+        "params": {"threshold": 3000},
+        "inputs": [f"{CACHE}ingest/merged/beccs_deployment.pkl"],
+        "outputs": [f"{PUBLIC}step1_scenario_type.csv"],
+    },
+    "step2": {
+        "label": "Cleaning Electricity Data",
+        "module": "scripts.step2_clean_electricity",
+        "code": ["backend/scripts/ingest.py"],
+        "entry": "main",
+        "params": {},
+        "inputs": [f"{CACHE}ingest/merged/electricity_data.pkl"],
+        "outputs": [f"{PUBLIC}step2_electricity_long.csv"],
+    },
+    "step3": {
+        "label": "Standardizing Time Series",
+        "module": "scripts.step3_standardize_timeseries",
+        "entry": "main",
+        "code": ["backend/scripts/cube.py", "backend/scripts/shards.py"],
+        "params": {"plots": False},
+        "inputs": [f"{PUBLIC}step2_electricity_long.csv"],
+        "outputs": [
+            f"{PUBLIC}step3_standardized.csv",
+            f"{PUBLIC}step3_modified_scenarios.csv",
+            f"{CACHE}step3_cube.npz",
+        ],
+    },
+    "step3_plots": {
+        "label": "Plotting Harmonization Diagnostics",
+        "kind": "plot",
+        "module": "scripts.plots",
+        "code": ["backend/scripts/step3_standardize_timeseries.py", "backend/scripts/step5_aggregate_outputs.py",
+                 "backend/scripts/cube.py", "backend/scripts/dtypes.py"],
+        "entry": "main",
+        "params": {"figures": [
+            "step3_diagnostics1_timeseries_by_variable",
+            "step3_diagnostics2_timeline_heatmap",
+            "step3_diagnostics3_model_scenario_histogram",
+        ]},
+        "inputs": [f"{PUBLIC}step2_electricity_long.csv", f"{PUBLIC}step3_standardized.csv"],
+        "outputs": [
+            f"{PUBLIC}step3_diagnostics1_timeseries_by_variable.png",
+            f"{PUBLIC}step3_diagnostics2_timeline_heatmap.png",
+            f"{PUBLIC}step3_diagnostics3_model_scenario_histogram.png",
+        ],
+    },
+    "step4": {
+        "label": "Calculating Indicators",
+        "module": "scripts.step4_calculate_indicators",
+        "code": ["backend/scripts/cube.py", "backend/scripts/shards.py"],
+        "entry": "main",
+        "params": {},
+        "inputs": [f"{CACHE}step3_cube.npz"],
+        "outputs": [f"{PUBLIC}step4_metrics.csv"],
+    },
+    "step5": {
+        "label": "Aggregating Outputs",
+        "module": "scripts.step5_aggregate_outputs",
+        "code": ["backend/scripts/cube.py", "backend/scripts/stats.py", "backend/scripts/sketch.py",
+                 "backend/scripts/shards.py", "backend/scripts/serialize.py"],
+        "entry": "main",
+        "params": {
+            "thresholds": {"effective": 2.5, "total": 1.0},
+            "plots": False,
+            "paths_layout": "records",
+            "paths_precision": 2,
+        },
+        "inputs": [
+            f"{CACHE}step3_cube.npz",
+            f"{PUBLIC}step1_scenario_type.csv",
+        ],
+        "outputs": [
+            f"{PUBLIC}step5_region_summary.json",
+            f"{PUBLIC}step5_benchmark_stats.json",
+            f"{PUBLIC}step5_scenario_gas_stats.csv",
+            f"{PUBLIC}step5_gas_share_summary.json",
+            f"{PUBLIC}step5_gas_share_paths.json",
+            f"{PUBLIC}step5_gas_timeseries_summary.json",
+            f"{PUBLIC}step5_gas_phaseout_paths.json",
+            f"{CACHE}step5_summary.pkl",
+        ],
+    },
+    "step5_plots": {
+        "label": "Plotting Gas Share Diagnostics",
+        "kind": "plot",
+        "module": "scripts.plots",
+        "code": ["backend/scripts/step3_standardize_timeseries.py", "backend/scripts/step5_aggregate_outputs.py",
+                 "backend/scripts/cube.py", "backend/scripts/dtypes.py"],
+        "entry": "main",
+        "params": {"figures": ["step5_diagnostic1_gas_share_timeseries_all_regions"]},
+        "inputs": [
+            f"{CACHE}step3_cube.npz",
+            f"{PUBLIC}step1_scenario_type.csv",
+            f"{PUBLIC}step5_gas_phaseout_paths.json",
+            f"{CACHE}step5_summary.pkl",
+        ],
+        "outputs": [f"{PUBLIC}step5_diagnostic1_gas_share_timeseries_all_regions.png"],
+    },
+    "step6": {
+        "label": "Exporting Final JSONs",
+        "module": "scripts.step6_export_json",
+        "entry": "main",
+        "params": {},
+        "inputs": [f"{PUBLIC}step5_scenario_gas_stats.csv", f"{DATA}country_region_map.csv"]
+        + [f"{PUBLIC}{f}" for f in step6.published_files if not f.startswith("step6_")],
+        "outputs": [f"{PUBLIC}step6_scenario_table.json", f"{PUBLIC}step6_country_region_map.json"]
+        + [f"{FRONTEND}{f}" for f in step6.published_files]
+        + [f"{FRONTEND}shards/standardized/manifest.json", f"{FRONTEND}asset-manifest.json"],
+    },
+    "step7": {
+        "label": "Writing SQLite Store",
+        "module": "scripts.step7_sqlite_store",
+        "entry": "main",
+        "params": {"chunk_rows": 100_000},
+        "inputs": [
+            f"{PUBLIC}step1_scenario_type.csv",
+            f"{PUBLIC}step2_electricity_long.csv",
+            f"{PUBLIC}step3_standardized.csv",
+            f"{PUBLIC}step4_metrics.csv",
+            f"{PUBLIC}step5_scenario_gas_stats.csv",
+        ],
+        "outputs": [f"{PUBLIC}step7_scenario_store.sqlite"],
+    },
+}
+
+# Streaming ingestion (run.py --stream): steps 1 and 2 read the workbook row by row in
+# openpyxl's read-only mode instead of the snapshot step 0 parses in full, so memory
+# stays bounded by the chunk size however large the workbook grows.
+STREAMING = {
+    "step1": {"params": {"streaming": True}, "inputs": [f"{DATA}scenario_data.xlsx"]},
+    "step2": {
+        "params": {"streaming": True, "chunk_rows": 5000},
+        "inputs": [f"{DATA}scenario_data.xlsx"],
+        "outputs": [f"{PUBLIC}step2_electricity_long.csv", f"{CACHE}step2_parts/index.json"],
+    },
+}
+
+
+# Incremental recompute (run.py --incremental): step 3 interpolates only the scenarios
+# added or changed since its last run, and steps 4–5 reuse their per-scenario results
+# for the rest, so an update costs in proportion to the delta.
+INCREMENTAL = {"step3": {"incremental": True}, "step4": {"incremental": True}, "step5": {"incremental": True}}
+
+
+# Sketched summaries (run.py --sketch-error): step 5 summarizes from mergeable quantile
+# sketches, with medians and quartiles within the given normalized rank error.
+def sketch_params(error):
+    return {"step5": {"summary": "sketch", "sketch_error": error}}
+
+
+# Region-sharded execution (run.py --shard-workers): steps 3–5 split their per-region
+# work across a process pool over shared-memory arrays; outputs are unchanged.
+def shard_params(workers, by="region"):
+    return {
+        "step3": {"shard_workers": workers},
+        "step4": {"shard_workers": workers},
+        "step5": {"shard_workers": workers, "shard_by": by},
+    }
+
+
+def with_params(overrides, steps=STEPS):
+    return {
+        name: {**step, "params": {**step["params"], **overrides[name]}} if name in overrides else step
+        for name, step in steps.items()
+    }
+
+
+def streaming_steps(steps=STEPS):
+    streamed = {}
+    for name, step in steps.items():
+        if name == "step0":
+            continue
+        override = STREAMING.get(name, {})
+        streamed[name] = {**step, **override, "params": {**step["params"], **override.get("params", {})}}
+    return streamed
+
+
+def with_sources(sources, steps=STEPS):
+    step0 = {**steps["step0"], "params": {**steps["step0"]["params"], "sources": list(sources)},
+             "inputs": source_files(sources)}
+    return {**steps, "step0": step0}
+
+
+# Out-of-core execution (run.py --out-of-core): streamed ingestion with step 2
+# partitioned by Model, so steps 2–4 hold one partition at a time. Memory is only
+# bounded for those steps: step 5 still loads the whole cube combined from the
+# partitions' slices (dense, two variables) and step 6 the whole standardized CSV,
+# so these set the peak for the largest ensembles. The diagnostic figures load
+# whole tables and are left out.
+OUT_OF_CORE = {
+    "step2": {"params": {"partition_by": "Model"}},
+    "step3": {
+        "params": {"partitioned": True},
+        "inputs": [f"{PUBLIC}step2_electricity_long.csv", f"{CACHE}step2_parts/index.json"],
+        "outputs": STEPS["step3"]["outputs"] + [f"{CACHE}step3_parts/index.json"],
+    },
+    "step4": {
+        "params": {"partitioned": True},
+        "inputs": [f"{CACHE}step3_cube.npz", f"{CACHE}step3_parts/index.json"],
+    },
+}
+
+
+def out_of_core_steps(steps=STEPS):
+    steps = streaming_steps(steps)
+    result = {}
+    for name, step in steps.items():
+        if step.get("kind") == "plot":
+            continue
+        override = OUT_OF_CORE.get(name, {})
+        result[name] = {**step, **override, "params": {**step["params"], **override.get("params", {})}}
+    return result
+
+
+def watched_files(steps=STEPS):
+    # Files a change in which can make a step stale: inputs no step produces,
+    # step scripts and shared modules, and this file (step parameters)
+    produced = {out for step in steps.values() for out in step["outputs"]}
+    files = {p for step in steps.values() for p in step["inputs"] if p not in produced}
+    for step in steps.values():
+        files.add(os.path.relpath(importlib.util.find_spec(step["module"]).origin))
+        files.update(step.get("code", []))
+    files.add(os.path.relpath(__file__))
+    return sorted(files)
+
+
+def code_hash(step):
+    # Hash the source of the step's module plus any shared modules it declares
+    module = importlib.import_module(step["module"])
+    h = hashlib.sha256()
+    for src in [module.__file__] + step.get("code", []):
+        with open(src, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def params_hash(step):
+    return hashlib.sha256(json.dumps(step["params"], sort_keys=True).encode()).hexdigest()
+
+
+def dependencies(steps=STEPS):
+    # step → set of upstream steps whose outputs it reads
+    producers = {out: name for name, step in steps.items() for out in step["outputs"]}
+    return {
+        name: {producers[p] for p in step["inputs"] if p in producers and producers[p] != name}
+        for name, step in steps.items()
+    }
+
+
+def topological_order(steps=STEPS):
+    deps = dependencies(steps)
+    order, done = [], set()
+    while len(order) < len(steps):
+        ready = [n for n in steps if n not in done and deps[n] <= done]
+        if not ready:
+            raise ValueError("Cycle detected in pipeline step graph")
+        for n in ready:
+            order.append(n)
+            done.add(n)
+    return order
+
+
+def descendants(names, steps=STEPS):
+    deps = dependencies(steps)
+    found = set(names)
+    changed = True
+    while changed:
+        changed = False
+        for n, ups in deps.items():
+            if n not in found and ups & found:
+                found.add(n)
+                changed = True
+    return found
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def fingerprint(step):
+    return {
+        "code": code_hash(step),
+        "params": params_hash(step),
+        "inputs": {p: file_hash(p) for p in step["inputs"]},
+    }
+
+
+def stale_reason(name, step, manifest):
+    # Returns why a step needs to run, or None if its recorded fingerprint still holds
+    record = manifest.get(name)
+    if record is None:
+        return "no previous run recorded"
+    current = fingerprint(step)
+    if current["code"] != record.get("code"):
+        return "script source changed"
+    if current["params"] != record.get("params"):
+        return "parameters changed"
+    for p, h in current["inputs"].items():
+        if h != record.get("inputs", {}).get(p):
+            return f"input changed: {p}"
+    for p in step["outputs"]:
+        if file_hash(p) != record.get("outputs", {}).get(p):
+            return f"output missing or modified: {p}"
+    return None
+
+
+def plan(steps=STEPS, manifest=None, force=False):
+    # Decide which steps must run: directly stale steps plus everything downstream of them
+    manifest = load_manifest() if manifest is None else manifest
+    reasons = {}
+    for name in topological_order(steps):
+        reason = "forced" if force else stale_reason(name, steps[name], manifest)
+        if reason:
+            reasons[name] = reason
+    for name in descendants(reasons, steps) - set(reasons):
+        reasons[name] = "upstream step reran"
+    return reasons
+
+
+def record(name, step, manifest):
+    entry = fingerprint(step)
+    entry["outputs"] = {p: file_hash(p) for p in step["outputs"]}
+    manifest[name] = entry
+
+
+def step_title(name, step):
+    number, _, suffix = name[len("step"):].partition("_")
+    return f"Step {number}{' ' + suffix if suffix else ''}: {step['label']}"
+
+
+def run_step(name, step, profile=False, trace_memory=False, force=False):
+    # Runs one step and returns its metrics: wall/CPU time, memory, phase breakdown
+    # and the row counts and sizes of the files it read and wrote. Entries with a
+    # cache of their own (figures, SQLite tables) take `force` to bypass it.
+    module = importlib.import_module(step["module"])
+    entry = getattr(module, step["entry"])
+    params = step["params"]
+    if force and "force" in inspect.signature(entry).parameters:
+        params = {**params, "force": True}
+    inputs = instrument.file_stats(step["inputs"])
+    with instrument.measure(trace_memory, f"{PROFILES}{name}.prof" if profile else None) as metrics:
+        entry(**params)
+    metrics["inputs"] = inputs
+    metrics["outputs"] = instrument.file_stats(step["outputs"])
+    metrics["bytes_written"] = sum(o["bytes"] for o in metrics["outputs"].values() if o)
+    return metrics
+
+
+def critical_path(durations, steps=STEPS):
+    # Longest chain of dependent steps by wall time; skipped steps count as zero
+    deps = dependencies(steps)
+    finish, via = {}, {}
+    for name in topological_order(steps):
+        before = max(deps[name], key=lambda d: finish[d], default=None)
+        finish[name] = durations.get(name, 0.0) + (finish[before] if before else 0.0)
+        via[name] = before
+    node = max(finish, key=finish.get)
+    path = []
+    while node:
+        path.append(node)
+        node = via[node]
+    return path[::-1], max(finish.values())
+
+
+def run(steps=STEPS, force=False, dry_run=False, workers=1, plots=True, profile=None, trace_memory=False,
+        streaming=False, sources=None, incremental=False, out_of_core=False,
+        sketch_error=None, shard_workers=None, shard_by="region"):
+    if sources:
+        steps = with_sources(sources, steps)
+    if incremental:
+        steps = with_params(INCREMENTAL, steps)
+    if sketch_error:
+        steps = with_params(sketch_params(sketch_error), steps)
+    if shard_workers:
+        steps = with_params(shard_params(shard_workers, shard_by), steps)
+    if out_of_core:
+        steps = out_of_core_steps(steps)
+    elif streaming:
+        steps = streaming_steps(steps)
+    if not plots:
+        # Diagnostic figures are optional; their PNGs are published as-is if they exist
+        steps = {name: step for name, step in steps.items() if step.get("kind") != "plot"}
+    manifest = load_manifest()
+    reasons = plan(steps, manifest, force)
+    if profile in steps and profile not in reasons:
+        reasons[profile] = "profiling requested"
+    deps = dependencies(steps)
+    order = topological_order(steps)
+    done, failed, durations, metrics = set(), set(), {}, {}
+    started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    for name in order:
+        if name not in reasons:
+            print(f"⏭️ {step_title(name, steps[name])} skipped – up to date.")
+            done.add(name)
+        elif dry_run:
+            print(f"📝 {step_title(name, steps[name])} would run – {reasons[name]}.")
+    if dry_run:
+        return failed
+
+    def ready():
+        # Steps whose upstream steps have all finished; failures propagate downstream
+        for name in order:
+            if name in done or name in failed or name in running.values():
+                continue
+            blocked = deps[name] & failed
+            if blocked:
+                print(f"⏭️ {step_title(name, steps[name])} skipped – upstream failed ({', '.join(sorted(blocked))}).")
+                failed.add(name)
+                continue
+            if deps[name] <= done:
+                yield name
+
+    def finish(name, outcome):
+        title = step_title(name, steps[name])
+        try:
+            metrics[name] = outcome()
+            durations[name] = metrics[name]["wall"]
+        except ImportError:
+            print(f"⏭️ {title} skipped – script not yet available.")
+            failed.add(name)
+            return
+        except Exception as e:
+            print(f"❌ {title} failed – {e}")
+            failed.add(name)
+            return
+        done.add(name)
+        record(name, steps[name], manifest)
+        save_manifest(manifest)
+
+    start = time.perf_counter()
+    running = {}
+    if workers <= 1:
+        # Serial mode runs in-process, in topological order
+        for name in order:
+            if name in done or name in failed or name not in set(ready()):
+                continue
+            print(f"▶️ {step_title(name, steps[name])}... ({reasons[name]})")
+            finish(name, lambda: run_step(name, steps[name], name == profile, trace_memory, force))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                for name in list(ready()):
+                    print(f"▶️ {step_title(name, steps[name])}... ({reasons[name]})")
+                    running[pool.submit(run_step, name, steps[name], name == profile, trace_memory, force)] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finish(running.pop(future), future.result)
+    wall = time.perf_counter() - start
+
+    path, length = critical_path(durations, steps) if durations else ([], 0.0)
+    if durations:
+        print(f"\n⏱️ Wall time {wall:.1f}s across {len(durations)} step(s) with {max(workers, 1)} worker(s).")
+        print(f"   Critical path ({length:.1f}s): " + " → ".join(f"{n} ({durations.get(n, 0.0):.1f}s)" for n in path))
+
+    save_run_manifest({
+        "started": started,
+        "wall": wall,
+        "workers": max(workers, 1),
+        "critical_path": path,
+        "steps": {
+            name: dict(
+                status="ran" if name in metrics else "failed" if name in failed else "skipped",
+                reason=reasons.get(name),
+                **metrics.get(name, {}),
+            )
+            for name in order
+        },
+    })
+    if profile in metrics:
+        print(f"   Profile for {profile} written to {metrics[profile]['profile']}")
+
+    return failed
+
+
+def save_run_manifest(run_manifest, path=RUN_MANIFEST_PATH):
+    # Machine-readable record of the latest run, one entry per step
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(run_manifest, f, indent=2)
+    os.replace(tmp, path)
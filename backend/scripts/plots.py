@@ -0,0 +1,455 @@
+import hashlib
+import json
+import math # For ceil and sqrt
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import seaborn as sns
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+
+from scripts import step3_standardize_timeseries as step3
+from scripts import step5_aggregate_outputs as step5
+from scripts.dtypes import expanded
+from scripts.instrument import phase
+from scripts.files import CACHE, PUBLIC, file_hash
+
+# Diagnostic figures, rendered apart from the data steps. Each figure reads its
+# data from disk, so figures can render in parallel worker processes, and each
+# is skipped when the hashes of its inputs and of the code drawing it are unchanged.
+# Each figure records its hash in its own file, so plot stages running at the same
+# time never write the same file.
+keys_dir = f"{CACHE}plots/"
+code_files = [__file__] + [
+    os.path.join(os.path.dirname(__file__), f)
+    for f in ["step3_standardize_timeseries.py", "step5_aggregate_outputs.py", "cube.py", "dtypes.py"]
+]
+
+FIGURES = {
+    "step3_diagnostics1_timeseries_by_variable": {
+        "render": "timeseries_by_variable",
+        "inputs": [step3.input_path, step3.output_path],
+    },
+    "step3_diagnostics2_timeline_heatmap": {
+        "render": "timeline_heatmap",
+        "inputs": [step3.input_path, step3.output_path],
+    },
+    "step3_diagnostics3_model_scenario_histogram": {
+        "render": "model_scenario_histogram",
+        "inputs": [step3.input_path],
+    },
+    "step5_diagnostic1_gas_share_timeseries_all_regions": {
+        "render": "gas_share_all_regions",
+        "inputs": [
+            "backend/cache/step3_cube.npz",
+            f"{PUBLIC}step1_scenario_type.csv",
+            f"{PUBLIC}step5_gas_phaseout_paths.json",
+            step5.summary_cache,
+        ],
+    },
+}
+STEP3_FIGURES = [name for name in FIGURES if name.startswith("step3_")]
+STEP5_FIGURES = [name for name in FIGURES if name.startswith("step5_")]
+
+
+def figure_path(name):
+    return f"{PUBLIC}{name}.png"
+
+
+def timeseries_by_variable(output):
+    df = expanded(step3.load_long())
+    standardized = pd.read_csv(step3.output_path)
+    variables = step3.variables
+
+    # Plot 1: Original + Harmonized Time Series
+    fig, axs = plt.subplots(2, 2, figsize=(16, 10), sharey=True, sharex=True)
+    datasets = [df, standardized]
+    titles = ["Original", "Harmonized"]
+
+    # Use this to extract handles and labels just once
+    legend_ax = axs[0][0]
+    legend_handles, legend_labels = None, None
+
+    for row, data in enumerate(datasets):
+        for col, var in enumerate(variables):
+            ax = axs[row][col]
+            subset = data[data["Variable_standardized"] == var]
+            if not subset.empty:
+                # Only keep legend for the first subplot temporarily
+                show_legend = (ax == legend_ax)
+                sns.lineplot(
+                    data=subset,
+                    x="Year", y="Value", hue="Model", ax=ax,
+                    linewidth=0.8, alpha=0.6, legend=show_legend
+                )
+
+            ax.set_title(f"{titles[row]} - {var}")
+            ax.set_xlabel("Year")
+            if col == 0:
+                ax.set_ylabel("Value")
+            else:
+                ax.set_ylabel("")
+
+    # ✅ Extract handles and remove the local legend
+    legend_handles, legend_labels = legend_ax.get_legend_handles_labels()
+    legend_ax.legend_.remove()
+
+    # ✅ Place single shared legend at bottom center
+    fig.legend(
+        legend_handles, legend_labels,
+        loc="lower center", bbox_to_anchor=(0.5, -0.1),
+        ncol=4, title="Model", fontsize=8, title_fontsize=9
+    )
+
+    plt.suptitle("Time Series by Variable – Before and After Harmonization", fontsize=16, y=1.02)
+    plt.tight_layout(rect=[0, 0.05, 1, 1])  # add space for bottom legend
+    plt.savefig(output, bbox_inches="tight")
+    plt.close()
+
+
+def timeline_heatmap(output):
+    df = expanded(step3.load_long())
+    standardized = pd.read_csv(step3.output_path)
+    variables = step3.variables
+
+    # Plot 2: Original + Harmonized Timeline Heatmaps
+    fig, axs = plt.subplots(2, 2, figsize=(18, 12), sharey=True, sharex=True)
+    datasets = [df, standardized]
+    titles = ["Original", "Harmonized"]
+
+    # Build consistent model index
+    all_models = sorted(set(df["Model"]).union(set(standardized["Model"])))
+
+    # Separate year ranges for original vs harmonized
+    full_years = list(range(2000, 2101, 5))
+
+
+    for row, data in enumerate(datasets):
+        timeline_df = data[data["Variable_standardized"].isin(variables)]
+        year_list = full_years
+        for col, var in enumerate(variables):
+            ax = axs[row][col]
+            subset = timeline_df[timeline_df["Variable_standardized"] == var]
+            if subset.empty:
+                continue
+
+            pivot = (
+                subset
+                .groupby(["Model", "Year"])
+                .size()
+                .unstack(fill_value=0)
+                .astype(bool)
+                .astype(int)
+            )
+
+            # ✅ Ensure consistent axes by reindexing
+            pivot = pivot.reindex(index=all_models, columns=year_list, fill_value=0)
+
+            sns.heatmap(
+                pivot,
+                cmap=sns.color_palette(["white", "steelblue"], as_cmap=True),
+                ax=ax,
+                cbar=False,
+                linewidths=0.5,
+                linecolor="white"
+            )
+
+            ax.set_title(f"{titles[row]} - {var}")
+            ax.set_xlabel("Year")
+            if col == 0:
+                ax.set_ylabel("Model")
+            else:
+                ax.set_ylabel("")
+
+    plt.suptitle("Timeline Heatmap – Before and After Harmonization", fontsize=14)
+    plt.tight_layout(rect=[0, 0, 1, 0.96])
+    plt.savefig(output)
+    plt.close()
+
+
+def model_scenario_histogram(output):
+    df = expanded(step3.load_long())
+
+    # 🔹 Plot 3: Histogram of number of scenarios by model
+    count_df = df[["Model", "Scenario_ID"]].drop_duplicates()
+    model_counts = count_df.groupby("Model")["Scenario_ID"].count().reset_index()
+    model_counts = model_counts.sort_values(by="Scenario_ID", ascending=False)
+
+    plt.figure(figsize=(12, 5))
+    ax = sns.barplot(data=model_counts, x="Model", y="Scenario_ID", color="skyblue")
+    plt.xticks(rotation=45, ha="right")
+    plt.xlabel("Model")
+    plt.ylabel("Number of Scenarios")
+    plt.title("Number of Scenarios per Model")
+
+    # Place labels above bars
+    for bar, count in zip(ax.patches, model_counts["Scenario_ID"]):
+        x = bar.get_x() + bar.get_width() / 2
+        y = bar.get_height()
+        ax.text(x, y + 0.5, str(count), ha='center', va='bottom', fontsize=8)
+
+    # Force integer ticks on Y-axis
+    ax.yaxis.set_major_locator(plt.MaxNLocator(integer=True))
+
+    # Total scenario count
+    total_scenarios = df["Scenario_ID"].nunique()
+    plt.text(
+        0.98, 0.95,
+        f"Total Scenarios: {total_scenarios}",
+        ha="right", va="top", transform=ax.transAxes,
+        fontsize=10, bbox=dict(facecolor='white', edgecolor='black', boxstyle='round,pad=0.3')
+    )
+
+    plt.tight_layout()
+    plt.savefig(output)
+    plt.close()
+
+
+def scenario_segments(subset):
+    # One (Year, Gas_Share) polyline per scenario; rows are already sorted by scenario then year
+    points = subset[["Year", "Gas_Share"]].to_numpy(dtype=float)
+    sids = subset["Scenario_ID"].to_numpy()
+    breaks = np.flatnonzero(sids[1:] != sids[:-1]) + 1
+    return np.split(points, breaks) if len(points) else []
+
+
+def gas_share_all_regions(output):
+    # The plot only needs the gas share pivot, its yearly summary and the median
+    # phase-out years, all of which can be rebuilt from the step 1/3/5 outputs on disk
+    df_pivot = expanded(step5.gas_share_pivot(step5.load_inputs()))
+    share_summary = pd.read_pickle(step5.summary_cache)["share"]
+    yearly_stats = step5.yearly_stats
+    with open(f"{PUBLIC}step5_gas_phaseout_paths.json") as f:
+        exit_years_by_scenario = json.load(f)
+    exit_years_summary = {
+        th: {
+            stype: {
+                region: int(pd.Series(sid_years.values()).median()) if sid_years else None
+                for region, sid_years in regions.items()
+            }
+            for stype, regions in stypes.items()
+        }
+        for th, stypes in exit_years_by_scenario.items()
+    }
+
+    # --- Time series plotting for ALL Regions (Multiple Plots) ---
+
+    all_regions = sorted(df_pivot["Region"].unique())
+    if "World" in all_regions:
+        all_regions.remove("World")
+        all_regions.insert(0, "World")
+    num_regions = len(all_regions)
+
+    # Determine grid size for subplots
+    cols = 3 # Let's aim for 3 columns per row
+    rows = math.ceil(num_regions / cols)
+
+    # Determine consistent Y-axis limits across all regions
+    # Using a fixed range (0-80%) as per previous discussions to ensure comparability.
+    y_min_global = 0
+    y_max_global = 80
+
+    # Determine consistent X-axis limits
+    x_min_global = df_pivot["Year"].min()
+    x_max_global = df_pivot["Year"].max()
+
+    fig, axs = plt.subplots(rows, cols, figsize=(cols * 6, rows * 5), sharex=True, sharey=True) # sharex/sharey ensures consistent scales
+    axs = axs.flatten() # Flatten the 2D array of axes for easy iteration
+
+    colors = {"Low-BECCS": "blue", "High-BECCS": "red"}
+
+    # Use this to extract handles and labels just once for a single legend
+    collected_labels = set()
+
+    for i, region_to_plot in enumerate(all_regions):
+        ax = axs[i] # Get the current subplot axis
+
+        # Filter data for the current region
+        df_region_plot = df_pivot[df_pivot["Region"] == region_to_plot].copy()
+
+        # Medians at 2030 for the CURRENT region
+        low_beccs_median_region = yearly_stats(share_summary, "Low-BECCS", region_to_plot, "Gas_Share")[1].get(2030, np.nan)
+        high_beccs_median_region = yearly_stats(share_summary, "High-BECCS", region_to_plot, "Gas_Share")[1].get(2030, np.nan)
+
+        for scenario_type in ["Low-BECCS", "High-BECCS"]:
+            subset_plot_stype = df_region_plot[df_region_plot["Scenario_Type"] == scenario_type].copy()
+
+            # Faint scenario lines for the current region, drawn as one collection
+            ax.add_collection(LineCollection(
+                scenario_segments(subset_plot_stype),
+                colors=colors[scenario_type], alpha=0.05, linewidths=0.5, zorder=1 # zorder to keep lines behind median
+            ))
+
+            # Median/IQR bands for the current region
+            q25_region_plot, median_region_plot, q75_region_plot = yearly_stats(
+                share_summary, scenario_type, region_to_plot, "Gas_Share"
+            )
+
+            # Shaded band
+            ax.fill_between(median_region_plot.index, q25_region_plot, q75_region_plot,
+                            color=colors[scenario_type], alpha=0.2, zorder=2)
+
+            # Median line - collect handles for the main legend
+            line, = ax.plot(median_region_plot.index, median_region_plot.values,
+                color=colors[scenario_type], linewidth=2.5, zorder=3)
+
+            # Annotate cross point (using current region's median)
+            cross_val = low_beccs_median_region if scenario_type == "Low-BECCS" else high_beccs_median_region
+
+            if pd.notna(cross_val) and 2030 in median_region_plot.index:
+                y_offset = 7 if scenario_type == "High-BECCS" else -7
+                ax.annotate(
+                    f"{cross_val:.1f}%",
+                    xy=(2030, cross_val),
+                    xytext=(2030 + 4, cross_val + y_offset),
+                    arrowprops=dict(arrowstyle="->", lw=1.2, color=colors[scenario_type]),
+                    fontsize=8,
+                    color=colors[scenario_type],
+                    bbox=dict(boxstyle="round,pad=0.2", fc="white", alpha=0.8, edgecolor=colors[scenario_type]),
+                    zorder=10
+                )
+
+        # Benchmark lines - using current region's medians
+        ax.axvline(2030, color="black", linestyle="--", linewidth=1.5, zorder=0) # Make it thinner
+
+        # Phase-out year lines: effective (2.5%) and total (1.0%) in consistent stacked order
+        phaseout_annotation_order = [
+            ("Low-BECCS", "effective", "-", "Eff", 0),
+            ("Low-BECCS", "total", ":", "Tot", 1),
+            ("High-BECCS", "effective", "-", "Eff", 2),
+            ("High-BECCS", "total", ":", "Tot", 3),
+        ]
+
+        for scenario_type, phase_type, linestyle, label_suffix, stack_idx in phaseout_annotation_order:
+            color = colors[scenario_type]
+            year = exit_years_summary[phase_type][scenario_type].get(region_to_plot)
+            if year is not None and x_min_global <= year <= x_max_global:
+                ax.axvline(year, color=color, linestyle=linestyle, linewidth=1.0, alpha=0.8, zorder=0)
+                vertical_offset = y_max_global - 5 - (stack_idx * 8)  # 8 units apart
+                ax.annotate(
+                    f"{label_suffix}: {year}",
+                    xy=(year, vertical_offset),
+                    xytext=(year + 2, vertical_offset),
+                    textcoords="data",
+                    fontsize=7,
+                    color=color,
+                    arrowprops=dict(arrowstyle="->", lw=0.8, color=color),
+                    bbox=dict(boxstyle="round,pad=0.2", fc="white", edgecolor=color, alpha=0.9),
+                    zorder=10
+                )
+        
+        # Collect benchmark line handles/labels only once for the overall legend
+        if low_beccs_median_region is not None:
+            label_text = f"Low-BECCS 2030 Median ({low_beccs_median_region:.1f}%)"
+            if label_text not in collected_labels:
+                collected_labels.add(label_text)
+            ax.axhline(low_beccs_median_region, color="blue", linestyle="--", linewidth=1.2, zorder=0)
+
+        if high_beccs_median_region is not None:
+            label_text = f"High-BECCS 2030 Median ({high_beccs_median_region:.1f}%)"
+            if label_text not in collected_labels:
+                collected_labels.add(label_text)
+            ax.axhline(high_beccs_median_region, color="red", linestyle="--", linewidth=1.2, zorder=0)
+
+
+        ax.set_title(f"{region_to_plot}", fontsize=12)
+        ax.set_xlabel("Year", fontsize=10)
+        ax.set_ylabel("Gas Share (%)", fontsize=10)
+        ax.grid(True, linestyle=':', alpha=0.7)
+        ax.set_ylim(y_min_global, y_max_global) # Apply consistent Y limits
+        ax.set_xlim(x_min_global, x_max_global) # Apply consistent X limits
+
+
+    # Hide any unused subplots if the number of regions doesn't perfectly fill the grid
+    for j in range(i + 1, len(axs)):
+        fig.delaxes(axs[j])
+
+    # Define dummy lines just once for legend
+    legend_handles = [
+        Line2D([0], [0], color="blue", linewidth=2.5, label="Low-BECCS Median"),
+        Line2D([0], [0], color="red", linewidth=2.5, label="High-BECCS Median")
+    ]
+
+    # Add a single overall legend at the bottom
+    fig.legend(
+        handles=legend_handles,
+        loc="lower center",
+        bbox_to_anchor=(0.5, 0.01),  # Moved up from -0.05 to be visible
+        ncol=2,                      # Only 2 labels now
+        title="Scenario Type",
+        fontsize=9,
+        title_fontsize=10
+    )
+
+    # Add overall title
+    plt.suptitle("Gas Share in Electricity Over Time by Scenario Type Across Regions", fontsize=16, y=0.98) # Adjust y for suptitle
+
+    plt.tight_layout(rect=[0, 0.08, 1, 0.95]) # Adjust rect to make space for the overall legend and title
+    plt.savefig(output, dpi=150)
+    plt.close()
+
+
+
+def figure_key(name):
+    h = hashlib.sha256(name.encode())
+    for src in code_files:
+        with open(src, "rb") as f:
+            h.update(f.read())
+    for p in FIGURES[name]["inputs"]:
+        h.update(str(file_hash(p)).encode())
+    return h.hexdigest()
+
+
+def key_path(name):
+    return f"{keys_dir}{name}.sha256"
+
+
+def recorded_key(name):
+    if not os.path.exists(key_path(name)):
+        return None
+    with open(key_path(name)) as f:
+        return f.read().strip()
+
+
+def record_key(name, key):
+    os.makedirs(keys_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=keys_dir, suffix=".tmp", delete=False) as f:
+        f.write(key)
+    os.replace(f.name, key_path(name))
+
+
+def render(name):
+    plt.switch_backend("Agg")
+    with phase("plot"):
+        globals()[FIGURES[name]["render"]](figure_path(name))
+    return name
+
+
+def main(figures=None, workers=None, force=False):
+    figures = list(FIGURES) if figures is None else figures
+    keys = {name: figure_key(name) for name in figures}
+    stale = [
+        name for name in figures
+        if force or recorded_key(name) != keys[name] or not os.path.exists(figure_path(name))
+    ]
+    for name in sorted(set(figures) - set(stale)):
+        print(f"⏭️ {name}.png skipped – data unchanged.")
+
+    workers = min(workers or os.cpu_count() or 1, len(stale))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(render, stale))
+    else:
+        done = [render(name) for name in stale]
+
+    for name in done:
+        record_key(name, keys[name])
+        print(f"✅ {name}.png saved.")
+
+
+if __name__ == "__main__":
+    main()
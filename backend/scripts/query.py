@@ -0,0 +1,125 @@
+import hashlib
+import json
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from scripts import ingest
+from scripts import step1_filter_beccs as step1
+from scripts import step2_clean_electricity as step2
+from scripts import step3_standardize_timeseries as step3
+from scripts import step5_aggregate_outputs as step5
+from scripts.dtypes import coded
+from scripts.stats import STATS, grouped_summary
+
+# Parameterized aggregate queries over the scenario cube, answered from memory.
+# Rows are the same (scenario, region, year) cells step 5 summarizes (tagged
+# scenarios with positive total electricity and a gas value), and statistics
+# come from the same grouped summary engine, so a query for the step 5 slices
+# returns the numbers in its JSON files before rounding.
+VARIABLES = ["Gas_Share", "Electricity|Gas", "Electricity"]
+
+
+class QueryError(ValueError):
+    pass
+
+
+class QueryStore:
+    def __init__(self, cube, cache_size=256):
+        share, keep, total, gas = step5.gas_share_matrix(cube)
+        s, r, y = np.nonzero(keep)
+        self.rows = pd.DataFrame({
+            "Scenario_Type": coded(cube.scenario_type[s], cube.types),
+            "Region": coded(r, cube.regions),
+            "Year": cube.years[y],
+            "Gas_Share": share[s, r, y],
+            "Electricity|Gas": gas[s, r, y],
+            "Electricity": total[s, r, y],
+        })
+        self.regions = sorted(self.rows["Region"].unique().tolist())
+        self.types = sorted(self.rows["Scenario_Type"].unique().tolist())
+        self.years = [int(v) for v in cube.years]
+        self.version = hashlib.sha256(pd.util.hash_pandas_object(self.rows).to_numpy().tobytes()).hexdigest()[:16]
+        self.response = lru_cache(maxsize=cache_size)(self._response)
+
+    @classmethod
+    def from_workbook(cls, workbook=ingest.workbook_path, threshold=3000, **kwargs):
+        beccs = ingest.read_sheet("beccs_deployment", workbook)
+        electricity = ingest.read_sheet("electricity_data", workbook)
+        _, _, cube = step3.standardize(step3.prepare_long(step2.to_long(electricity)))
+        return cls(cube.with_scenario_types(step1.classify(beccs, threshold)), **kwargs)
+
+    def meta(self):
+        return {
+            "variables": VARIABLES,
+            "regions": self.regions,
+            "types": self.types,
+            "years": self.years,
+            "stats": STATS + ["q<percent>, e.g. q25"],
+            "version": self.version,
+        }
+
+    def normalize(self, params):
+        # Query string parameters → hashable, validated query key
+        def values(name, allowed, default):
+            raw = params.get(name)
+            chosen = default if not raw else [v for part in raw for v in part.split(",") if v]
+            unknown = [v for v in chosen if allowed is not None and v not in allowed]
+            if unknown:
+                raise QueryError(f"Unknown {name}: {', '.join(unknown)}")
+            return tuple(chosen)
+
+        def year(name, default):
+            raw = params.get(name)
+            try:
+                return int(raw[0]) if raw else default
+            except ValueError:
+                raise QueryError(f"{name} must be a year")
+
+        variable = values("variable", VARIABLES, ["Gas_Share"])
+        if len(variable) != 1:
+            raise QueryError("Exactly one variable per query")
+        stats = []
+        for stat in values("stat", None, ["median"]):
+            if stat.startswith("q") and stat[1:].isdigit() and 0 <= int(stat[1:]) <= 100:
+                stat = f"q{int(stat[1:])}"
+            elif stat not in STATS:
+                raise QueryError(f"Unknown stat: {stat}")
+            stats.append(stat)
+        return (
+            variable[0],
+            tuple(sorted(values("region", self.regions, self.regions))),
+            tuple(sorted(values("type", self.types, self.types))),
+            year("start", self.years[0]),
+            year("end", self.years[-1]),
+            tuple(dict.fromkeys(stats)),
+        )
+
+    def aggregate(self, variable, regions, types, start, end, stats):
+        rows = self.rows[
+            self.rows["Region"].isin(regions) & self.rows["Scenario_Type"].isin(types)
+            & self.rows["Year"].between(start, end)
+        ]
+        quantiles = [int(s[1:]) / 100 for s in stats if s not in STATS]
+        summary = grouped_summary(
+            rows[["Scenario_Type", "Region", "Year"]], rows[[variable]],
+            stats=[s for s in stats if s in STATS], quantiles=quantiles,
+        )
+        groups = []
+        for (scenario_type, region), block in summary.groupby(level=["Scenario_Type", "Region"], sort=True, observed=True):
+            group = {"type": scenario_type, "region": region, "year": block.index.get_level_values("Year").tolist()}
+            for stat in stats:
+                group[stat] = [None if np.isnan(v) else float(v) for v in block[(variable, stat)].to_numpy(dtype=float)]
+            groups.append(group)
+        return {
+            "query": {"variable": variable, "regions": list(regions), "types": list(types),
+                      "start": start, "end": end, "stats": list(stats)},
+            "groups": groups,
+        }
+
+    def _response(self, key):
+        # Serialized body and its ETag; cached per normalized query
+        body = json.dumps(self.aggregate(*key), separators=(",", ":")).encode()
+        etag = '"' + hashlib.sha256(self.version.encode() + body).hexdigest()[:32] + '"'
+        return body, etag
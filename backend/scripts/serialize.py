@@ -0,0 +1,88 @@
+import json
+import math
+
+import numpy as np
+
+# Streaming JSON writers for the large per-path artifacts of step 5. Records are
+# formatted from arrays and written path by path instead of building one big
+# list of dicts for json.dump.
+
+
+def _number(x):
+    # Same float spelling as the json module
+    if math.isnan(x):
+        return "NaN"
+    if math.isinf(x):
+        return "Infinity" if x > 0 else "-Infinity"
+    return float.__repr__(x)
+
+
+def split_model_scenario(sid):
+    # Attempt to split Scenario_ID into model and scenario parts
+    if " - " in sid:
+        return sid.split(" - ", 1)
+    return "Unknown", sid
+
+
+def path_bounds(keys):
+    # Start/stop offsets of runs of equal (Scenario_ID, Region) keys in sorted rows
+    if len(keys[0]) == 0:
+        return np.zeros(0, int), np.zeros(0, int)
+    change = np.zeros(len(keys[0]), dtype=bool)
+    change[0] = True
+    for k in keys:
+        change[1:] |= k[1:] != k[:-1]
+    starts = np.flatnonzero(change)
+    return starts, np.append(starts[1:], len(keys[0]))
+
+
+def write_path_records(out_path, sids, regions, types, years, values, precision=2):
+    # Layout: [{"model", "scenario", "region", "type", "values": [{"year", "value"}, ...]}, ...]
+    # byte-compatible with json.dump(..., indent=2). Rows must be sorted by path, then year.
+    starts, stops = path_bounds([sids, regions])
+    year_text = [str(int(y)) for y in years]
+    value_text = [_number(v) for v in np.round(np.asarray(values, dtype=float), precision).tolist()]
+
+    with open(out_path, "w") as f:
+        if len(starts) == 0:
+            f.write("[]")
+            return
+        f.write("[")
+        for n, (a, b) in enumerate(zip(starts, stops)):
+            model, scenario_name = split_model_scenario(sids[a])
+            points = ",".join(
+                f'\n      {{\n        "year": {year_text[i]},\n        "value": {value_text[i]}\n      }}'
+                for i in range(a, b)
+            )
+            f.write(
+                ("," if n else "")
+                + "\n  {\n"
+                + f'    "model": {json.dumps(model)},\n'
+                + f'    "scenario": {json.dumps(scenario_name)},\n'
+                + f'    "region": {json.dumps(regions[a])},\n'
+                + f'    "type": {json.dumps(types[a])},\n'
+                + f'    "values": [{points}\n    ]\n'
+                + "  }"
+            )
+        f.write("\n]")
+
+
+def write_path_columns(out_path, sids, regions, types, year_axis, matrix, precision=2):
+    # Compact layout: one shared year axis and a values array per path (null where
+    # the path has no value for a year), without indentation.
+    # {"years": [...], "paths": [{"model", "scenario", "region", "type", "values": [...]}, ...]}
+    rounded = np.round(np.asarray(matrix, dtype=float), precision)
+    with open(out_path, "w") as f:
+        f.write('{"years":' + json.dumps([int(y) for y in year_axis]) + ',"paths":[')
+        for n, row in enumerate(rounded.tolist()):
+            model, scenario_name = split_model_scenario(sids[n])
+            values = ",".join("null" if math.isnan(v) else _number(v) for v in row)
+            f.write(
+                ("," if n else "")
+                + json.dumps(
+                    {"model": model, "scenario": scenario_name, "region": regions[n], "type": types[n]},
+                    separators=(",", ":"),
+                )[:-1]
+                + f',"values":[{values}]}}'
+            )
+        f.write("]}")
@@ -0,0 +1,66 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Region-sharded execution for steps 3–5. A kernel runs once per shard (a region,
+# or a region × scenario type) in a process pool; the arrays it reads and the ones
+# it fills in are placed in shared memory, so workers get views of them instead of
+# pickled copies. Each shard only touches its own rows, and per-shard results come
+# back in shard order, so merged outputs match a serial run byte for byte.
+
+
+@contextmanager
+def shared(arrays):
+    # Copy arrays into shared memory blocks; yields their specs (name, shape, dtype)
+    # and the views, and frees the blocks on exit
+    blocks, specs, views = [], {}, {}
+    try:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            views[name] = np.ndarray(array.shape, array.dtype, buffer=block.buf)
+            views[name][...] = array
+            specs[name] = (block.name, array.shape, array.dtype.str)
+        yield specs, views
+    finally:
+        views.clear()
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def attach(specs):
+    blocks = {name: shared_memory.SharedMemory(name=spec[0]) for name, spec in specs.items()}
+    arrays = {name: np.ndarray(spec[1], np.dtype(spec[2]), buffer=blocks[name].buf) for name, spec in specs.items()}
+    return blocks, arrays
+
+
+def run_shard(kernel, shard, specs, options):
+    blocks, arrays = attach(specs)
+    try:
+        return kernel(shard, arrays, **options)
+    finally:
+        arrays.clear()
+        for block in blocks.values():
+            block.close()
+
+
+def map_shards(kernel, shards, inputs, outputs=None, workers=1, **options):
+    # kernel(shard, arrays, **options) reads `inputs` and writes its rows of `outputs`
+    # (name → (shape, dtype), zero-initialized) in place; returns the filled outputs
+    # and the kernel results in shard order
+    outputs = outputs or {}
+    arrays = {**inputs, **{name: np.zeros(shape, dtype) for name, (shape, dtype) in outputs.items()}}
+    workers = min(workers or 1, len(shards))
+    if workers <= 1:
+        results = [kernel(shard, arrays, **options) for shard in shards]
+        return {name: arrays[name] for name in outputs}, results
+
+    with shared(arrays) as (specs, views), ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run_shard, [kernel] * len(shards), shards, [specs] * len(shards),
+                                [options] * len(shards)))
+        filled = {name: views[name].copy() for name in outputs}
+    return filled, results
@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+
+from scripts.stats import STATS, _quantile_name, group_rows
+
+# Mergeable quantile sketches for the step 5 summaries (KLL-style compactors).
+# A sketch keeps every value until a level outgrows its capacity; the level is
+# then sorted and every other item promoted with doubled weight, so memory stays
+# O(k) per group however many values stream in, and sketches built from separate
+# partitions, workers or updates merge by concatenating their levels.
+#
+# Until a sketch first compacts it holds every value, and its statistics use the
+# same arithmetic as stats.grouped_summary, so results are then identical to the
+# exact engine. After that, quantiles are within the normalized rank error of
+# rank_error(k) (DataSketches' KLL bound, 99% confidence); count, min, max and
+# the sum behind the mean are always kept exactly.
+
+
+def rank_error(k):
+    return 2.296 / k ** 0.9723
+
+
+def k_for_error(error):
+    return max(int(np.ceil((2.296 / error) ** (1 / 0.9723))), 8)
+
+
+class QuantileSketch:
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.sum = 0.0
+        self.min = np.nan
+        self.max = np.nan
+        self.compacted = False
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_error(cls, error, seed=0):
+        return cls(k_for_error(error), seed)
+
+    @property
+    def error(self):
+        # Normalized rank error bound (0 while every value is still held)
+        return rank_error(self.k) if self.compacted else 0.0
+
+    def capacity(self, level):
+        # The top level holds k items, each one below it 2/3 of the one above
+        depth = len(self.levels) - 1 - level
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def update(self, values):
+        # NaNs are skipped; they count as zero in the sum, as in grouped_summary's mean
+        values = np.asarray(values, dtype=float)
+        ok = ~np.isnan(values)
+        if not ok.any():
+            return self
+        self.sum += np.where(ok, values, 0.0).sum()
+        values = values[ok]
+        self.count += len(values)
+        self.min = np.nanmin([self.min, values.min()])
+        self.max = np.nanmax([self.max, values.max()])
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge sketches of different sizes (k={self.k} and k={other.k})")
+        if not other.count:
+            return self
+        self.levels += [np.empty(0)] * (len(other.levels) - len(self.levels))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.sum += other.sum
+        self.min = np.nanmin([self.min, other.min])
+        self.max = np.nanmax([self.max, other.max])
+        self.compacted |= other.compacted
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                # An odd item stays behind; of the sorted pairs, a random half moves up
+                items = np.sort(items)
+                odd = len(items) % 2
+                promoted = items[odd + self.rng.integers(2)::2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = items[:odd]
+                self.compacted = True
+            level += 1
+
+    def _sorted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(held), 1 << level, dtype=np.int64)
+                                  for level, held in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def _order_stat(self, ranks):
+        # Value at 0-based rank(s) among the `count` weighted values
+        items, cumulative = self._sorted()
+        return items[np.searchsorted(cumulative, np.asarray(ranks), side="right")]
+
+    def quantile(self, q):
+        # Linear interpolation between order statistics, as groupby quantile
+        if not self.count:
+            return np.nan
+        q_idx = q * float(self.count - 1)
+        base = int(q_idx)
+        frac = q_idx % 1
+        val, nxt = self._order_stat([base, min(base + 1, self.count - 1)])
+        return val if frac == 0.0 else val + (nxt - val) * frac
+
+    def median(self):
+        if not self.count:
+            return np.nan
+        low, high = self._order_stat([(self.count - 1) // 2, self.count // 2])
+        return high if self.count % 2 == 1 else (high + low) / 2
+
+    def mean(self):
+        return self.sum / self.count if self.count else np.nan
+
+    def stat(self, name):
+        if name == "count":
+            return self.count
+        if name in ("min", "max"):
+            return getattr(self, name)
+        if name in ("mean", "median"):
+            return getattr(self, name)()
+        raise ValueError(f"Unknown statistic: {name}")
+
+
+def grouped_sketches(keys, values, error=0.01, seed=0):
+    # {group key tuple: {metric: sketch}}, one sketch per (group, metric); rows with
+    # a missing key are left out, as in grouped_summary
+    by_group, _, starts, index = group_rows(keys)
+    ends = np.append(starts[1:], len(by_group))
+    columns = {metric: values[metric].to_numpy(dtype=float)[by_group] for metric in values.columns}
+    groups = {}
+    for key, a, b in zip(index, starts, ends):
+        key = key if isinstance(key, tuple) else (key,)
+        groups[key] = {metric: QuantileSketch.from_error(error, seed).update(v[a:b]) for metric, v in columns.items()}
+    return groups
+
+
+def merge_grouped(parts):
+    # Merge grouped sketches from partitions, workers or updates into the first
+    merged = {}
+    for part in parts:
+        for key, sketches in part.items():
+            if key not in merged:
+                merged[key] = sketches
+                continue
+            for metric, sketch in sketches.items():
+                merged[key][metric].merge(sketch)
+    return merged
+
+
+def summarize(groups, names, metrics, stats=STATS, quantiles=(0.25, 0.75)):
+    # The grouped_summary table (sorted group index, (metric, stat) columns) from sketches
+    keys = sorted(groups)
+    result = {}
+    for metric in metrics:
+        sketches = [groups[key][metric] for key in keys]
+        for stat in stats:
+            result[(metric, stat)] = np.array([s.stat(stat) for s in sketches],
+                                              dtype=int if stat == "count" else float)
+        for q in quantiles:
+            result[(metric, _quantile_name(q))] = np.array([s.quantile(q) for s in sketches], dtype=float)
+    index = pd.MultiIndex.from_tuples(keys, names=names) if len(names) > 1 \
+        else pd.Index([key[0] for key in keys], name=names[0])
+    summary = pd.DataFrame(result, index=index)
+    summary.columns = pd.MultiIndex.from_tuples(summary.columns, names=["metric", "stat"])
+    return summary
+
+
+def sketch_summary(keys, values, stats=STATS, quantiles=(0.25, 0.75), error=0.01):
+    return summarize(grouped_sketches(keys, values, error), list(keys.columns), list(values.columns), stats, quantiles)
+
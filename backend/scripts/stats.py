@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+# Grouped summary engine for step 5. One call sorts the rows by group key once
+# and derives every requested statistic for every (group, metric) from that
+# order, using the same arithmetic as the pandas calls it replaces:
+#   min/max     – Series.min/max (NaN skipped)
+#   mean        – Series.mean (NaNs zero-filled, pairwise sum in row order / count)
+#   median      – groupby median (mean of the two middle values)
+#   q25/q75/... – groupby quantile (linear interpolation between order statistics)
+STATS = ["count", "min", "mean", "median", "max"]
+
+
+def _quantile_name(q):
+    return f"q{int(round(q * 100))}"
+
+
+def group_rows(keys):
+    # Row order grouping the rows contiguously (original order inside each group),
+    # each row's group code in that order, group start offsets, and the sorted group index
+    key_cols = list(keys.columns)
+    # Rows with a missing key (e.g. untagged scenarios) get code -1 and are left out
+    codes = keys.groupby(key_cols, sort=True, dropna=True, observed=True).ngroup().fillna(-1).astype(int).to_numpy()
+    valid = codes >= 0
+    n_groups = codes.max() + 1 if valid.any() else 0
+
+    # Group rows contiguously, keeping their original order inside each group
+    by_group = np.argsort(np.where(valid, codes, n_groups), kind="stable")[: valid.sum()]
+    group_codes = codes[by_group]
+    starts = np.searchsorted(group_codes, np.arange(n_groups))
+
+    first_rows = by_group[starts] if n_groups else by_group[:0]
+    index = pd.MultiIndex.from_frame(keys.iloc[first_rows].reset_index(drop=True)) if len(key_cols) > 1 \
+        else pd.Index(keys.iloc[first_rows, 0].to_numpy(), name=key_cols[0])
+    return by_group, group_codes, starts, index
+
+
+def grouped_summary(keys, values, stats=STATS, quantiles=(0.25, 0.75)):
+    # keys: DataFrame of group columns; values: DataFrame of metric columns on the same rows.
+    # Returns a DataFrame indexed by the sorted group keys with (metric, stat) columns.
+    by_group, group_codes, starts, index = group_rows(keys)
+    n_groups = len(starts)
+
+    result = {}
+    for metric in values.columns:
+        v = values[metric].to_numpy(dtype=float)[by_group]
+        ok = ~np.isnan(v)
+        count = np.bincount(group_codes, weights=ok, minlength=n_groups)
+        has = count > 0
+
+        # Order statistics: sort by (group, value) with NaNs dropped
+        order = np.lexsort((v[ok], group_codes[ok]))
+        sorted_v = v[ok][order]
+        sorted_start = np.concatenate([[0], np.cumsum(count)[:-1]]).astype(int) if n_groups else np.zeros(0, int)
+        n = count.astype(int)
+
+        def order_stat(k):
+            return sorted_v[np.minimum(sorted_start + k, max(len(sorted_v) - 1, 0))] if len(sorted_v) \
+                else np.full(n_groups, np.nan)
+
+        for stat in stats:
+            if stat == "count":
+                out = n
+            elif stat == "min":
+                out = np.where(has, order_stat(np.zeros(n_groups, int)), np.nan)
+            elif stat == "max":
+                out = np.where(has, order_stat(n - 1), np.nan)
+            elif stat == "mean":
+                filled = np.where(ok, v, 0.0)
+                sums = np.array([filled[a:b].sum() for a, b in zip(starts, np.append(starts[1:], len(filled)))]) \
+                    if n_groups else np.zeros(0)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    out = np.where(has, sums / np.maximum(n, 1), np.nan)
+            elif stat == "median":
+                low = order_stat(np.maximum((n - 1) // 2, 0))
+                high = order_stat(n // 2)
+                out = np.where(has, np.where(n % 2 == 1, high, (high + low) / 2), np.nan)
+            else:
+                raise ValueError(f"Unknown statistic: {stat}")
+            result[(metric, stat)] = out
+
+        for q in quantiles:
+            q_idx = q * (n - 1).astype(float)
+            base = np.maximum(q_idx.astype(int), 0)
+            frac = q_idx % 1
+            val = order_stat(base)
+            nxt = order_stat(np.minimum(base + 1, np.maximum(n - 1, 0)))
+            out = np.where(frac == 0.0, val, val + (nxt - val) * frac)
+            result[(metric, _quantile_name(q))] = np.where(has, out, np.nan)
+
+    summary = pd.DataFrame(result, index=index)
+    summary.columns = pd.MultiIndex.from_tuples(summary.columns, names=["metric", "stat"])
+    return summary
@@ -1,26 +1,36 @@
 import pandas as pd
 import os
 
-def main():
-    # Paths
-    input_path = "backend/data/scenario_data.xlsx"
-    output_path = "backend/public_data/step1_scenario_type.csv"
+from scripts import ingest
+from scripts.instrument import phase
 
-    # Load BECCS deployment sheet
-    beccs_df = pd.read_excel(input_path, sheet_name="beccs_deployment")
+output_path = "backend/public_data/step1_scenario_type.csv"
 
+def classify(beccs_df, threshold=3000):  # MtCO₂
     # Classify based on BECCS deployment in 2050
-    threshold = 3000  # MtCO₂
     beccs_2050 = beccs_df[["Model", "Scenario", "Variable", 2050]].copy()
     beccs_2050["Scenario_ID"] = beccs_2050["Model"] + " - " + beccs_2050["Scenario"]
     beccs_2050["BECCS_Type"] = beccs_2050[2050].apply(
         lambda x: "Low-BECCS" if x < threshold else "High-BECCS"
     )
 
-    # Save just ID and classification
-    tags = beccs_2050[["Scenario_ID", "BECCS_Type"]]
+    # Keep just ID and classification
+    return beccs_2050[["Scenario_ID", "BECCS_Type"]]
+
+def save(tags):
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    tags.to_csv(output_path, index=False)
+    with phase("serialize"):
+        tags.to_csv(output_path, index=False)
+
+def main(threshold=3000, streaming=False):
+    if streaming:
+        # Only the columns the classification reads, streamed from the workbook
+        beccs_df = pd.concat(ingest.iter_sheet("beccs_deployment", columns=["Model", "Scenario", "Variable"], years=[2050]),
+                             ignore_index=True)
+    else:
+        # Load BECCS deployment sheet (merged from every source by step 0)
+        beccs_df = ingest.read_merged("beccs_deployment")
+    save(classify(beccs_df, threshold))
 
     print("✅ step1_scenario_type.csv written to backend/public_data/")
 
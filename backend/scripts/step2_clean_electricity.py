@@ -1,18 +1,20 @@
-import pandas as pd
+import json
 import os
+import shutil
 
-def main():
-    # Paths
-    input_path = "backend/data/scenario_data.xlsx"
-    output_path = "backend/public_data/step2_electricity_long.csv"
+from scripts import ingest
+from scripts.dtypes import compact
+from scripts.instrument import phase
 
-    # Load electricity sheet
-    df = pd.read_excel(input_path, sheet_name="electricity_data")
+output_path = "backend/public_data/step2_electricity_long.csv"
+parts_dir = "backend/cache/step2_parts/"
 
+def to_long(df):
     # Add Scenario_ID
     df["Scenario_ID"] = df["Model"] + " - " + df["Scenario"]
+    compact(df)
 
-    # Melt into long format
+    # Melt into long format (the categorical id columns are repeated as integer codes)
     year_cols = [col for col in df.columns if isinstance(col, int)]
     long_df = df.melt(
         id_vars=["Scenario_ID", "Model", "Scenario", "Region", "Variable", "Unit"],
@@ -22,11 +24,52 @@ def main():
     )
 
     # Drop rows with missing values
-    long_df = long_df.dropna(subset=["Value"])
+    return compact(long_df.dropna(subset=["Value"]).copy())
 
-    # Save
+def save(long_df):
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    long_df.to_csv(output_path, index=False)
+    with phase("serialize"):
+        long_df.to_csv(output_path, index=False)
+
+def stream(workbook=ingest.workbook_path, chunk_rows=5000, partition_by=None):
+    # Melt the sheet chunk by chunk straight from the workbook. Every wide row is one
+    # whole series, so by default each chunk becomes a self-contained partition; with
+    # partition_by (e.g. "Model") rows are appended to one partition per key instead,
+    # which keeps whole scenarios together. The same rows are appended to the
+    # combined CSV the later steps read.
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    os.makedirs(parts_dir)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    parts = {}
+    with open(f"{output_path}.tmp", "w") as combined:
+        for i, chunk in enumerate(ingest.iter_sheet("electricity_data", workbook, chunk_rows=chunk_rows)):
+            long_df = to_long(chunk)
+            with phase("serialize"):
+                long_df.to_csv(combined, index=False, header=i == 0)
+                groups = long_df.groupby(partition_by, observed=True, sort=False) if partition_by else [(i, long_df)]
+                for key, rows in groups:
+                    key = key[0] if isinstance(key, tuple) else key
+                    part = parts.setdefault(key, {"key": key, "file": f"part-{len(parts):05d}.csv", "rows": 0})
+                    rows.to_csv(os.path.join(parts_dir, part["file"]), index=False, mode="a", header=not part["rows"])
+                    part["rows"] += len(rows)
+        if not combined.tell():
+            combined.write(",".join(["Scenario_ID", "Model", "Scenario", "Region", "Variable", "Unit", "Year", "Value"]) + "\n")
+    os.replace(f"{output_path}.tmp", output_path)
+
+    with open(os.path.join(parts_dir, "index.json"), "w") as f:
+        json.dump({"workbook": workbook, "chunk_rows": chunk_rows, "partition_by": partition_by,
+                   "parts": list(parts.values())}, f, indent=2)
+    return list(parts.values())
+
+def main(streaming=False, chunk_rows=5000, partition_by=None):
+    if streaming:
+        parts = stream(chunk_rows=chunk_rows, partition_by=partition_by)
+        print(f"✅ step2_electricity_long.csv written to backend/public_data/ ({len(parts)} streamed partition(s) in {parts_dir})")
+        return
+
+    # Load electricity sheet (merged from every source by step 0)
+    df = ingest.read_merged("electricity_data")
+    save(to_long(df))
 
     print("✅ step2_electricity_long.csv written to backend/public_data/")
 
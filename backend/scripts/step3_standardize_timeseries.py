@@ -1,17 +1,29 @@
 import pandas as pd
 import numpy as np
+import json
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
+import shutil
 
-def main():
-    input_path = "backend/public_data/step2_electricity_long.csv"
-    output_path = "backend/public_data/step3_standardized.csv"
-    modified_output = "backend/public_data/step3_modified_scenarios.csv"
-    plot_dir = "backend/public_data"
+from scripts import incremental as changes
+from scripts import step2_clean_electricity as step2
+from scripts.cube import ScenarioCube
+from scripts.dtypes import CSV_DTYPES, compact
+from scripts.instrument import phase
+from scripts.shards import map_shards
 
-    df = pd.read_csv(input_path)
-    df["Year"] = df["Year"].astype(int)
+input_path = "backend/public_data/step2_electricity_long.csv"
+output_path = "backend/public_data/step3_standardized.csv"
+modified_output = "backend/public_data/step3_modified_scenarios.csv"
+state_path = "backend/cache/step3_state.pkl"
+parts_dir = "backend/cache/step3_parts/"
+
+variables = ["Electricity", "Electricity|Gas"]
+
+def load_long():
+    return prepare_long(pd.read_csv(input_path, dtype=CSV_DTYPES, float_precision="round_trip"))
+
+def prepare_long(df):
+    df = compact(df.copy())
 
     # Normalize variable names to handle variation
     df["Variable_clean"] = df["Variable"].str.strip().str.lower()
@@ -20,185 +32,194 @@ def main():
         "secondary energy|electricity|gas": "Electricity|Gas"
     }
     df["Variable_standardized"] = df["Variable_clean"].map(var_map)
+    return compact(df)
+
+all_years = list(range(2010, 2101, 5))
+series_keys = ["Scenario_ID", "Variable", "Region"]
+meta_cols = ["Scenario_ID", "Model", "Scenario", "Region", "Variable", "Unit", "Variable_clean", "Variable_standardized"]
+
+def fill_linear(values):
+    # Linear interpolation along each row of a series × year matrix, with the
+    # edges held at the nearest reported value. Uses the same arithmetic as
+    # np.interp (what pandas' interpolate calls per series) so results match bit for bit.
+    n_years = values.shape[1]
+    valid = ~np.isnan(values)
+    idx = np.arange(n_years)
+
+    prev = np.maximum.accumulate(np.where(valid, idx, -1), axis=1)
+    nxt = np.minimum.accumulate(np.where(valid, idx, n_years)[:, ::-1], axis=1)[:, ::-1]
+    has_prev = prev >= 0
+    has_next = nxt < n_years
+
+    rows = np.arange(values.shape[0])[:, None]
+    y0 = values[rows, np.clip(prev, 0, n_years - 1)]
+    y1 = values[rows, np.clip(nxt, 0, n_years - 1)]
+    with np.errstate(invalid="ignore"):
+        slope = (y1 - y0) / (nxt - prev)
+        interior = slope * (idx - prev) + y0
+
+    edge = np.where(has_prev, y0, y1)
+    return np.where(valid, values, np.where(has_prev & has_next, interior, edge))
+
+def series_matrix(df, years=all_years):
+    # Only keep years in the target range; the first report of a year wins. Rows
+    # with a blank key belong to no series (groupby drops them too)
+    in_range = df[(df["Year"] >= years[0]) & (df["Year"] <= years[-1])].dropna(subset=series_keys)
+    in_range = in_range.drop_duplicates(subset=series_keys + ["Year"])
+
+    # Dense series × year matrix, series in groupby (sorted key) order
+    codes = in_range.groupby(series_keys, sort=True, observed=True).ngroup().to_numpy()
+    cols = pd.Index(years).get_indexer(in_range["Year"])
+    on_grid = cols >= 0
+    values = np.full((codes.max() + 1 if len(codes) else 0, len(years)), np.nan)
+    values[codes[on_grid], cols[on_grid]] = in_range["Value"].to_numpy()[on_grid]
+
+    # Metadata comes from each series' first in-range row
+    first = ~pd.Series(codes).duplicated().to_numpy()
+    meta = in_range.loc[first, meta_cols].set_axis(codes[first]).sort_index()
+    return meta, values
+
+def assemble(meta, filled, modified, years=all_years):
+    # Metadata columns are repeated per year as categorical codes, not strings
+    rows = np.repeat(np.arange(len(meta)), len(years))
+    standardized = pd.DataFrame({"Year": np.tile(np.asarray(years, dtype="int16"), len(meta))})
+    for col in meta_cols[:6]:
+        standardized[col] = meta[col].array.take(rows)
+    standardized["Value"] = filled.ravel()
+    for col in meta_cols[6:]:
+        standardized[col] = meta[col].array.take(rows)
+
+    modified_ids = sorted(set(meta.loc[modified, "Scenario_ID"]))
+    cube = ScenarioCube.from_series(meta, filled, modified, years)
+    return standardized, modified_ids, cube
+
+def fill_region(region, arrays):
+    # Shard kernel: gap-fill the series of one region in place
+    rows = np.flatnonzero(arrays["region"] == region)
+    arrays["filled"][rows] = fill_linear(arrays["values"][rows])
+
+def fill_sharded(meta, values, workers):
+    # Every series is filled on its own, so region shards give the serial result
+    region, _ = pd.factorize(meta["Region"])
+    filled, _ = map_shards(fill_region, np.unique(region).tolist(), {"values": values, "region": region},
+                           {"filled": (values.shape, values.dtype)}, workers)
+    return filled["filled"]
+
+def standardize(df, years=all_years, workers=1):
+    meta, values = series_matrix(df, years)
+    modified = np.isnan(values).any(axis=1)
+    filled = fill_sharded(meta, values, workers) if workers > 1 else fill_linear(values)
+    return assemble(meta, filled, modified, years)
+
+def standardize_incremental(df, years=all_years):
+    # Interpolate only the scenarios added or changed since the last run and reuse
+    # the cached filled series of the rest. Series of one scenario depend on its
+    # rows alone and sort by Scenario_ID first, so the result equals a full run.
+    hashes = changes.scenario_hashes(df)
+    state = changes.load_state(state_path)
+    full = state is None or state["years"] != list(years)
+    if full:
+        delta = {"added": sorted(hashes), "changed": [], "removed": []}
+    else:
+        delta = changes.diff(state["hashes"], hashes)
+    redo = set(delta["added"]) | set(delta["changed"])
+
+    meta, values = series_matrix(df[df["Scenario_ID"].isin(redo)], years)
+    modified = np.isnan(values).any(axis=1)
+    filled = fill_linear(values)
+    if not full:
+        kept = ~state["meta"]["Scenario_ID"].isin(redo | set(delta["removed"])).to_numpy()
+        meta = pd.concat([state["meta"][kept].astype(object), meta.astype(object)], ignore_index=True)
+        order = meta.sort_values(series_keys, kind="stable").index.to_numpy()
+        meta = compact(meta.loc[order].reset_index(drop=True))
+        filled = np.vstack([state["filled"][kept], filled])[order]
+        modified = np.concatenate([state["modified"][kept], modified])[order]
+
+    new_token = changes.token(hashes)
+    changes.save_state({
+        "years": list(years), "hashes": hashes, "token": new_token,
+        "meta": meta, "filled": filled, "modified": modified,
+    }, state_path)
+    delta = {"base": None if full else state["token"], "token": new_token, "full": full, **delta}
+    changes.save_delta(delta)
+    return assemble(meta, filled, modified, years), delta
+
+def partition_order(parts):
+    # Step 2 partitions by Model; every Scenario_ID starts with "<Model> - ", so
+    # handling partitions in that prefix order keeps the output in sorted key order
+    return sorted(parts, key=lambda part: f"{part['key']} - ")
+
+def standardize_partitions():
+    # Out-of-core: interpolate one step 2 partition at a time, appending its rows to
+    # the standardized CSV and saving its (small) cube slice for step 4. Only the
+    # slices of the two standardized variables are combined into the full cube.
+    with open(os.path.join(step2.parts_dir, "index.json")) as f:
+        parts = partition_order(json.load(f)["parts"])
+    if not parts:
+        raise ValueError(f"No step 2 partitions in {step2.parts_dir}")
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    os.makedirs(parts_dir)
+
+    cubes, modified_ids, written, last_id = [], set(), [], None
+    with open(f"{output_path}.tmp", "w") as out:
+        for i, part in enumerate(parts):
+            df = prepare_long(pd.read_csv(os.path.join(step2.parts_dir, part["file"]), dtype=CSV_DTYPES,
+                                          float_precision="round_trip"))
+            with phase("interpolate"):
+                standardized, modified, cube = standardize(df)
+            ids = standardized["Scenario_ID"]
+            if len(ids) and last_id is not None and ids.iat[0] <= last_id:
+                raise ValueError(f"Partition {part['key']!r} overlaps an earlier one in Scenario_ID order")
+            last_id = ids.iat[-1] if len(ids) else last_id
+            with phase("serialize"):
+                standardized.to_csv(out, index=False, header=i == 0)
+                name = part["file"].replace(".csv", ".npz")
+                cube.save(os.path.join(parts_dir, name))
+            written.append({"key": part["key"], "file": name, "scenarios": len(cube.scenarios),
+                            "rows": len(standardized)})
+            modified_ids.update(modified)
+            cubes.append(cube)
+    os.replace(f"{output_path}.tmp", output_path)
+
+    with open(os.path.join(parts_dir, "index.json"), "w") as f:
+        json.dump({"parts": written}, f, indent=2)
+    with phase("serialize"):
+        pd.DataFrame({"Scenario_ID": sorted(modified_ids)}).to_csv(modified_output, index=False)
+        ScenarioCube.concat(cubes).save()
+    return written
+
+def save(standardized, modified_ids, cube):
+    os.makedirs("backend/public_data", exist_ok=True)
+    with phase("serialize"):
+        standardized.to_csv(output_path, index=False)
+        pd.DataFrame({"Scenario_ID": modified_ids}).to_csv(modified_output, index=False)
+        cube.save()
 
-    variables = ["Electricity", "Electricity|Gas"]
+def main(plots=True, incremental=False, partitioned=False, shard_workers=1):
+    if partitioned:
+        parts = standardize_partitions()
+        changes.discard_delta()
+        print(f"✅ Step 3 completed. {len(parts)} partition(s) standardized out of core.")
+        return
+
+    df = load_long()
 
     # 🔄 Interpolation
-    all_years = list(range(2010, 2101, 5))
-    modified_rows = []
-
-
-    def interpolate_group(group):
-        # Only keep years in the target range
-        group = group[(group["Year"] >= 2010) & (group["Year"] <= 2100)]
-        group = group.drop_duplicates(subset="Year")
-
-        # Build complete year index at 5-year steps
-        full_years = pd.DataFrame({'Year': all_years})
-        merged = pd.merge(full_years, group, on="Year", how="left")
-
-        before = merged["Value"].isna().sum()
-        merged["Value"] = (
-            merged["Value"]
-            .interpolate(method="linear", limit_direction="both")
-            .ffill()
-            .bfill()
-        )
-        after = merged["Value"].isna().sum()
-
-        if before > 0:
-            modified_rows.append(group.iloc[0]["Scenario_ID"])
-
-        # Copy metadata columns
-        for col in ["Scenario_ID", "Model", "Scenario", "Region", "Variable", "Unit", "Variable_clean", "Variable_standardized"]:
-            merged[col] = group[col].iloc[0]
-        return merged
-    
-
-    standardized = (
-        df.groupby(["Scenario_ID", "Variable", "Region"], group_keys=False)
-        .apply(interpolate_group)
-    )
-    standardized = standardized.reset_index(drop=True)
+    with phase("interpolate"):
+        if incremental:
+            (standardized, modified_rows, cube), delta = standardize_incremental(df)
+            print(f"🔁 Incremental interpolation: {changes.describe(delta)}.")
+        else:
+            standardized, modified_rows, cube = standardize(df, workers=shard_workers)
+            changes.discard_delta()
 
-    os.makedirs("backend/public_data", exist_ok=True)
-    standardized.to_csv(output_path, index=False)
-    pd.DataFrame({"Scenario_ID": sorted(set(modified_rows))}).to_csv(modified_output, index=False)
-
-    # Plot 1: Original + Harmonized Time Series
-    fig, axs = plt.subplots(2, 2, figsize=(16, 10), sharey=True, sharex=True)
-    datasets = [df, standardized]
-    titles = ["Original", "Harmonized"]
-
-    # Use this to extract handles and labels just once
-    legend_ax = axs[0][0]
-    legend_handles, legend_labels = None, None
-
-    for row, data in enumerate(datasets):
-        for col, var in enumerate(variables):
-            ax = axs[row][col]
-            subset = data[data["Variable_standardized"] == var]
-            if not subset.empty:
-                # Only keep legend for the first subplot temporarily
-                show_legend = (ax == legend_ax)
-                sns.lineplot(
-                    data=subset,
-                    x="Year", y="Value", hue="Model", ax=ax,
-                    linewidth=0.8, alpha=0.6, legend=show_legend
-                )
-
-            ax.set_title(f"{titles[row]} - {var}")
-            ax.set_xlabel("Year")
-            if col == 0:
-                ax.set_ylabel("Value")
-            else:
-                ax.set_ylabel("")
-
-    # ✅ Extract handles and remove the local legend
-    legend_handles, legend_labels = legend_ax.get_legend_handles_labels()
-    legend_ax.legend_.remove()
-
-    # ✅ Place single shared legend at bottom center
-    fig.legend(
-        legend_handles, legend_labels,
-        loc="lower center", bbox_to_anchor=(0.5, -0.1),
-        ncol=4, title="Model", fontsize=8, title_fontsize=9
-    )
-
-    plt.suptitle("Time Series by Variable – Before and After Harmonization", fontsize=16, y=1.02)
-    plt.tight_layout(rect=[0, 0.05, 1, 1])  # add space for bottom legend
-    plt.savefig(f"{plot_dir}/step3_diagnostics1_timeseries_by_variable.png", bbox_inches="tight")
-    plt.close()
-
-    # Plot 2: Original + Harmonized Timeline Heatmaps
-    fig, axs = plt.subplots(2, 2, figsize=(18, 12), sharey=True, sharex=True)
-    datasets = [df, standardized]
-    titles = ["Original", "Harmonized"]
-
-    # Build consistent model index
-    all_models = sorted(set(df["Model"]).union(set(standardized["Model"])))
-
-    # Separate year ranges for original vs harmonized
-    full_years = list(range(2000, 2101, 5))
-
-
-    for row, data in enumerate(datasets):
-        timeline_df = data[data["Variable_standardized"].isin(variables)]
-        year_list = full_years
-        for col, var in enumerate(variables):
-            ax = axs[row][col]
-            subset = timeline_df[timeline_df["Variable_standardized"] == var]
-            if subset.empty:
-                continue
-
-            pivot = (
-                subset
-                .groupby(["Model", "Year"])
-                .size()
-                .unstack(fill_value=0)
-                .astype(bool)
-                .astype(int)
-            )
-
-            # ✅ Ensure consistent axes by reindexing
-            pivot = pivot.reindex(index=all_models, columns=year_list, fill_value=0)
-
-            sns.heatmap(
-                pivot,
-                cmap=sns.color_palette(["white", "steelblue"], as_cmap=True),
-                ax=ax,
-                cbar=False,
-                linewidths=0.5,
-                linecolor="white"
-            )
-
-            ax.set_title(f"{titles[row]} - {var}")
-            ax.set_xlabel("Year")
-            if col == 0:
-                ax.set_ylabel("Model")
-            else:
-                ax.set_ylabel("")
-
-    plt.suptitle("Timeline Heatmap – Before and After Harmonization", fontsize=14)
-    plt.tight_layout(rect=[0, 0, 1, 0.96])
-    plt.savefig(f"{plot_dir}/step3_diagnostics2_timeline_heatmap.png")
-    plt.close()
-
-    # 🔹 Plot 3: Histogram of number of scenarios by model
-    count_df = df[["Model", "Scenario_ID"]].drop_duplicates()
-    model_counts = count_df.groupby("Model")["Scenario_ID"].count().reset_index()
-    model_counts = model_counts.sort_values(by="Scenario_ID", ascending=False)
-
-    plt.figure(figsize=(12, 5))
-    ax = sns.barplot(data=model_counts, x="Model", y="Scenario_ID", color="skyblue")
-    plt.xticks(rotation=45, ha="right")
-    plt.xlabel("Model")
-    plt.ylabel("Number of Scenarios")
-    plt.title("Number of Scenarios per Model")
-
-    # Place labels above bars
-    for bar, count in zip(ax.patches, model_counts["Scenario_ID"]):
-        x = bar.get_x() + bar.get_width() / 2
-        y = bar.get_height()
-        ax.text(x, y + 0.5, str(count), ha='center', va='bottom', fontsize=8)
-
-    # Force integer ticks on Y-axis
-    ax.yaxis.set_major_locator(plt.MaxNLocator(integer=True))
-
-    # Total scenario count
-    total_scenarios = df["Scenario_ID"].nunique()
-    plt.text(
-        0.98, 0.95,
-        f"Total Scenarios: {total_scenarios}",
-        ha="right", va="top", transform=ax.transAxes,
-        fontsize=10, bbox=dict(facecolor='white', edgecolor='black', boxstyle='round,pad=0.3')
-    )
-
-    plt.tight_layout()
-    plt.savefig(f"{plot_dir}/step3_diagnostics3_model_scenario_histogram.png")
-    plt.close()
-
-    print("✅ Step 3 completed. Outputs and diagnostics saved.")
+    save(standardized, modified_rows, cube)
+
+    if plots:
+        from scripts import plots as diagnostics
+        diagnostics.main(figures=diagnostics.STEP3_FIGURES)
+
+    print("✅ Step 3 completed. Outputs and diagnostics saved." if plots else "✅ Step 3 completed. Outputs saved.")
 
 if __name__ == "__main__":
     main()
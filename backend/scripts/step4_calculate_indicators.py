@@ -1,36 +1,132 @@
 # scripts/step4_calculate_indicators.py
 
 import pandas as pd
+import numpy as np
+import json
 import os
 
-def main():
-    input_path = "backend/public_data/step3_standardized.csv"
-    output_metrics = "backend/public_data/step4_metrics.csv"
+from scripts import incremental as changes
+from scripts import step3_standardize_timeseries as step3
+from scripts.cube import ScenarioCube
+from scripts.instrument import phase
+from scripts.shards import map_shards
 
-    df = pd.read_csv(input_path)
-    df["Year"] = df["Year"].astype(int)
+output_metrics = "backend/public_data/step4_metrics.csv"
+state_path = "backend/cache/step4_state.pkl"
 
-    # Filter to ensure Variable_standardized exists
-    df = df[df["Variable_standardized"].notna()]
+def kahan_mean(values):
+    # NaN-skipping mean along the year axis, accumulated in year order with
+    # Kahan compensation exactly like pandas' groupby mean
+    total = np.zeros(values.shape[:-1])
+    compensation = np.zeros(values.shape[:-1])
+    count = np.zeros(values.shape[:-1])
+    for j in range(values.shape[-1]):
+        val = values[..., j]
+        ok = ~np.isnan(val)
+        y = val - compensation
+        t = total + y
+        comp = t - total - y
+        compensation = np.where(ok, np.where(np.isnan(comp), 0.0, comp), compensation)
+        total = np.where(ok, t, total)
+        count += ok
+    with np.errstate(invalid="ignore"):
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
 
+STATS = ["Min_Value", "Max_Value", "Mean_Value", "Trend"]
+
+def series_stats(series):
+    # Reductions over the year axis of a (series, year) matrix
+    with np.errstate(invalid="ignore"):
+        return {
+            "Min_Value": np.fmin.reduce(series, axis=1) if len(series) else np.zeros(0),
+            "Max_Value": np.fmax.reduce(series, axis=1) if len(series) else np.zeros(0),
+            "Mean_Value": kahan_mean(series),
+            "Trend": series[:, -1] - series[:, 0] if series.shape[1] > 1 else np.full(len(series), np.nan),
+        }
+
+def region_stats(region, arrays):
+    # Shard kernel: metrics of one region's series, written to their rows in place
+    rows = np.flatnonzero(arrays["r"] == region)
+    stats = series_stats(arrays["values"][arrays["s"][rows], region, arrays["v"][rows]])
+    for col in STATS:
+        arrays[col][rows] = stats[col]
+
+def indicators(cube, workers=1):
     # Calculate metrics by Scenario, Variable, and REGION
-    # By including 'Region' in the groupby, metrics will be calculated for each region separately.
-    grouped = df.groupby(["Scenario_ID", "Region", "Variable_standardized"])
-
-    summary = grouped.agg(
-        Start_Year=("Year", "min"),
-        End_Year=("Year", "max"),
-        Min_Value=("Value", "min"),
-        Max_Value=("Value", "max"),
-        Mean_Value=("Value", "mean"),
-        Trend=("Value", lambda x: x.iloc[-1] - x.iloc[0] if len(x) > 1 else None),
-    ).reset_index()
-
-    # Save output
+    # Every standardized series is one (scenario, region, variable) cell of the cube,
+    # so the metrics are reductions over its year axis.
+    s, r, v = np.nonzero(cube.present)
+
+    with phase("aggregate"):
+        if workers > 1:
+            # Series are independent; each region shard fills in its own rows
+            stats, _ = map_shards(region_stats, np.unique(r).tolist(), {"values": cube.values, "s": s, "r": r, "v": v},
+                                  {col: ((len(s),), "float64") for col in STATS}, workers)
+        else:
+            stats = series_stats(cube.values[s, r, v])  # (series, year), cube order = sorted groupby order
+        summary = pd.DataFrame({
+            "Scenario_ID": cube.scenarios[s],
+            "Region": cube.regions[r],
+            "Variable_standardized": cube.variables[v],
+            "Start_Year": np.full(len(s), cube.years.min()),
+            "End_Year": np.full(len(s), cube.years.max()),
+            **stats,
+        })
+
+    return summary
+
+def indicators_incremental(cube):
+    # Metrics are per series, so only the scenarios in the step 3 delta are computed;
+    # the cached rows of every other scenario are reused and all rows put back in cube order
+    state = changes.load_state(state_path)
+    delta = changes.usable_delta(state)
+    if delta is None or state["years"] != cube.years.tolist():
+        summary = indicators(cube)
+    else:
+        redo = set(delta["added"]) | set(delta["changed"])
+        old = state["summary"]
+        old = old[~old["Scenario_ID"].isin(redo | set(delta["removed"]))]
+        summary = pd.concat([old, indicators(cube.subset(redo))], ignore_index=True)
+        summary = summary.sort_values(["Scenario_ID", "Region", "Variable_standardized"], kind="stable",
+                                      ignore_index=True)
+    changes.save_state({"token": changes.current_token(), "years": cube.years.tolist(), "summary": summary},
+                       state_path)
+    return summary, delta
+
+def indicators_partitioned():
+    # Out-of-core: one step 3 cube slice at a time, rows appended in partition order
+    # (which is the full cube's scenario order)
+    with open(os.path.join(step3.parts_dir, "index.json")) as f:
+        parts = json.load(f)["parts"]
+    os.makedirs(os.path.dirname(output_metrics), exist_ok=True)
+    with open(f"{output_metrics}.tmp", "w") as out:
+        for i, part in enumerate(parts):
+            summary = indicators(ScenarioCube.load(os.path.join(step3.parts_dir, part["file"])))
+            with phase("serialize"):
+                summary.to_csv(out, index=False, header=i == 0)
+    os.replace(f"{output_metrics}.tmp", output_metrics)
+    return parts
+
+def save(summary):
     os.makedirs("backend/public_data", exist_ok=True)
-    summary.to_csv(output_metrics, index=False)
+    with phase("serialize"):
+        summary.to_csv(output_metrics, index=False)
+
+def main(incremental=False, partitioned=False, shard_workers=1):
+    if partitioned:
+        parts = indicators_partitioned()
+        print(f"✅ Step 4 complete: Indicators calculated for {len(parts)} partition(s) and saved.")
+        return
+
+    cube = ScenarioCube.load()
+    if incremental:
+        summary, delta = indicators_incremental(cube)
+        print(f"🔁 Incremental indicators: {changes.describe(delta)}.")
+    else:
+        summary = indicators(cube, workers=shard_workers)
+    save(summary)
 
     print("✅ Step 4 complete: Indicators calculated and saved.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,141 +1,301 @@
 import pandas as pd
+import numpy as np
 import os
 import json
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib.offsetbox import AnchoredText
-import math # For ceil and sqrt
-
-def main():
-    # Paths
-    path = "backend/public_data/"
-    # IMPORTANT: Changed output filename to reflect multiple regions
-    output_plot_path = f"{path}step5_diagnostic1_gas_share_timeseries_all_regions.png"
-
-    # Load data
-    df = pd.read_csv(f"{path}step3_standardized.csv")
-    df_type = pd.read_csv(f"{path}step1_scenario_type.csv")
-    df_type.rename(columns={"BECCS_Type": "Scenario_Type"}, inplace=True)
-
-    df = df.merge(df_type, on="Scenario_ID", how="left")
-
-    # Filter for gas and total electricity
-    gas = df[df["Variable_standardized"] == "Electricity|Gas"]
-    total = df[df["Variable_standardized"] == "Electricity"]
-
-    # 2020 & 2030 data (Region column is correctly maintained here)
-    gas_2020 = gas[gas["Year"] == 2020][["Scenario_ID", "Region", "Value"]].rename(columns={"Value": "Gas_2020"})
-    gas_2030 = gas[gas["Year"] == 2030][["Scenario_ID", "Region", "Value", "Scenario_Type"]].rename(columns={"Value": "Gas_2030"})
-    total_2030 = total[total["Year"] == 2030][["Scenario_ID", "Region", "Value"]].rename(columns={"Value": "Total_2030"})
-
-    merged = gas_2030.merge(gas_2020, on=["Scenario_ID", "Region"], how="inner")
-    merged = merged.merge(total_2030, on=["Scenario_ID", "Region"], how="inner")
-
-    # Metrics
-    merged["Pct_Drop"] = 100 * (merged["Gas_2020"] - merged["Gas_2030"]) / merged["Gas_2020"]
-    merged["Gas_Share_2030"] = 100 * merged["Gas_2030"] / merged["Total_2030"]
-
-    # Prepare data for time series, still retaining ALL Regions
-    df_filtered = df[df["Variable_standardized"].isin(["Electricity", "Electricity|Gas"])]
-    df_pivot = df_filtered.pivot_table(
-        index=["Scenario_ID", "Region", "Year", "Scenario_Type"],
-        columns="Variable_standardized", # This pivots 'Variable_standardized' values to columns
-        values="Value"
-    ).reset_index()
-    df_pivot = df_pivot[df_pivot["Electricity"] > 0]
-    # Ensure 'Electricity|Gas' column exists before creating 'Gas_Share'
-    if 'Electricity|Gas' in df_pivot.columns:
-        df_pivot["Gas_Share"] = 100 * df_pivot["Electricity|Gas"] / df_pivot["Electricity"]
-    else:
-        # Handle cases where 'Electricity|Gas' might not be present for some Scenario_ID/Region combinations
-        df_pivot["Gas_Share"] = float('nan') # Set to NaN if 'Electricity|Gas' column is missing
 
-    df_pivot = df_pivot[df_pivot["Gas_Share"].notna()]
-    
-    # Compute gas phase-out years using thresholds: 2.5% (effective), 1.0% (total)
-    thresholds = {"effective": 2.5, "total": 1.0}
+from scripts import incremental as changes
+from scripts.cube import ScenarioCube
+from scripts.dtypes import coded
+from scripts.instrument import phase
+from scripts.shards import map_shards
+from scripts.sketch import grouped_sketches, k_for_error, rank_error, summarize
+from scripts.stats import grouped_summary
+from scripts.serialize import write_path_records, write_path_columns
+
+# Paths
+path = "backend/public_data/"
+summary_cache = "backend/cache/step5_summary.pkl"
+state_path = "backend/cache/step5_state.pkl"
+
+# The two summary tables: group keys, metrics and statistics
+SHARE_SUMMARY = (["Scenario_Type", "Region", "Year"], ["Gas_Share", "Electricity|Gas"],
+                 {"stats": ["count", "median"], "quantiles": (0.25, 0.75)})
+METRIC_SUMMARY = (["Scenario_Type", "Region"], ["Gas_2030", "Pct_Drop", "Gas_Share_2030"],
+                  {"stats": ["count", "min", "mean", "median", "max"], "quantiles": ()})
+
+def load_inputs():
+    df_type = pd.read_csv(f"{path}step1_scenario_type.csv")
+    return ScenarioCube.load().with_scenario_types(df_type)
+
+def gas_share_matrix(cube):
+    # Gas share (%) as a (scenario, region, year) matrix; NaN outside tagged
+    # scenarios with positive total electricity and a reported gas value
+    total, _ = cube.variable("Electricity")
+    gas, _ = cube.variable("Electricity|Gas")
+    typed = (cube.scenario_type >= 0)[:, None, None]
+    with np.errstate(invalid="ignore"):
+        keep = typed & (total > 0) & ~np.isnan(gas)
+    share = np.full(keep.shape, np.nan)
+    share[keep] = 100 * gas[keep] / total[keep]
+    return share, keep, total, gas
+
+def first_crossing(share, thresholds):
+    # Index of the first year at or below each threshold along the last (year) axis,
+    # for all thresholds at once; -1 where the series never gets there
+    with np.errstate(invalid="ignore"):
+        below = share[None, ...] <= np.asarray(thresholds, dtype=float).reshape((-1,) + (1,) * share.ndim)
+    return np.where(below.any(axis=-1), below.argmax(axis=-1), -1)
+
+def phaseout_years(cube, share, keep, thresholds, stypes, exit_idx=None):
+    # First year at or below each named threshold per (scenario, region), plus
+    # scenario → year maps and median years per scenario type and region
+    if exit_idx is None:
+        exit_idx = first_crossing(share, list(thresholds.values()))  # threshold × scenario × region
+    exit_years = np.where(exit_idx >= 0, cube.years[exit_idx], -1)
     exit_years_by_scenario = {th: {} for th in thresholds}    # threshold → scenario_type → region → sid → year
     exit_years_summary = {th: {} for th in thresholds}        # threshold → scenario_type → region → median year
 
-    for th_name, th_val in thresholds.items():
-        for stype in ["Low-BECCS", "High-BECCS"]:
-            if stype not in exit_years_by_scenario[th_name]:
-                exit_years_by_scenario[th_name][stype] = {}
-                exit_years_summary[th_name][stype] = {}
-            stype_df = df_pivot[df_pivot["Scenario_Type"] == stype]
+    type_codes = {label: code for code, label in enumerate(cube.types)}
+    type_rows = {stype: cube.scenario_type == type_codes.get(stype, -2) for stype in stypes}
+    for i, th_name in enumerate(thresholds):
+        for stype in stypes:
+            exit_years_by_scenario[th_name][stype] = {}
+            exit_years_summary[th_name][stype] = {}
+            rows = type_rows[stype]
+            for r in np.flatnonzero(keep[rows].any(axis=(0, 2))):
+                region = cube.regions[r]
+                hit = rows & (exit_idx[i, :, r] >= 0)
+                years = exit_years[i, hit, r]
+                exit_years_by_scenario[th_name][stype][region] = dict(zip(cube.scenarios[hit], years.tolist()))
+                exit_years_summary[th_name][stype][region] = int(np.median(years)) if len(years) else None
+    return exit_years, exit_years_by_scenario, exit_years_summary
+
+def crossings_incremental(cube, share, thresholds):
+    # Phase-out crossings are per (scenario, region): reuse the cached ones of every
+    # scenario outside the step 3 delta whose type tag is unchanged
+    levels = list(thresholds.values())
+    labels = cube.type_labels()
+    state = changes.load_state(state_path)
+    delta = changes.usable_delta(state)
+    if delta is None or not len(state["scenarios"]) or [state[k] for k in ("thresholds", "regions", "years")] != \
+            [levels, cube.regions.tolist(), cube.years.tolist()]:
+        exit_idx, delta = first_crossing(share, levels), None
+    else:
+        prev = pd.Index(state["scenarios"]).get_indexer(cube.scenarios)
+        old_labels = np.where(prev >= 0, state["labels"][prev], None)
+        same_tag = (old_labels == labels) | (pd.isna(old_labels) & pd.isna(labels))
+        redo = set(delta["added"]) | set(delta["changed"])
+        reuse = (prev >= 0) & same_tag & ~np.isin(cube.scenarios, list(redo))
+        exit_idx = np.empty((len(levels),) + share.shape[:2], dtype=int)
+        exit_idx[:, reuse] = state["exit_idx"][:, prev[reuse]]
+        exit_idx[:, ~reuse] = first_crossing(share[~reuse], levels)
+    changes.save_state({
+        "token": changes.current_token(), "thresholds": levels, "regions": cube.regions.tolist(),
+        "years": cube.years.tolist(), "scenarios": cube.scenarios, "labels": labels, "exit_idx": exit_idx,
+    }, state_path)
+    return exit_idx, delta
+
+def gas_share_pivot(cube):
+    # Prepare data for time series, still retaining ALL Regions: one row per
+    # (scenario, region, year) with positive total electricity and a gas value
+    _, keep, total, gas = gas_share_matrix(cube)
+    s, r, y = np.nonzero(keep)
+
+    # String dimensions as categoricals over the cube's own axis labels
+    df_pivot = pd.DataFrame({
+        "Scenario_ID": coded(s, cube.scenarios),
+        "Region": coded(r, cube.regions),
+        "Year": cube.years[y],
+        "Scenario_Type": coded(cube.scenario_type[s], cube.types),
+        "Electricity": total[s, r, y],
+        "Electricity|Gas": gas[s, r, y],
+    })
+    df_pivot["Gas_Share"] = 100 * df_pivot["Electricity|Gas"] / df_pivot["Electricity"]
+    return df_pivot
+
+def scenario_metrics(cube):
+    # 2020 & 2030 indicators as (scenario, region) matrices; `pairs` marks the
+    # combinations reporting both gas and total electricity
+    _, gas_present = cube.variable("Electricity|Gas")
+    _, total_present = cube.variable("Electricity")
+    metrics = {
+        "pairs": gas_present & total_present,
+        "Gas_2020": cube.at_year("Electricity|Gas", 2020),
+        "Gas_2030": cube.at_year("Electricity|Gas", 2030),
+        "Total_2030": cube.at_year("Electricity", 2030),
+    }
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics["Pct_Drop"] = 100 * (metrics["Gas_2020"] - metrics["Gas_2030"]) / metrics["Gas_2020"]
+        metrics["Gas_Share_2030"] = 100 * metrics["Gas_2030"] / metrics["Total_2030"]
+    return metrics
+
+def summary_regions(share_summary, scenario_type):
+    if scenario_type not in share_summary.index.get_level_values("Scenario_Type"):
+        return []
+    return list(share_summary.loc[scenario_type].index.unique("Region"))
+
+def yearly_stats(share_summary, scenario_type, region, metric):
+    # Year-indexed q25/median/q75 Series for one scenario type and region (empty if no rows)
+    if (scenario_type, region) in share_summary.index.droplevel("Year"):
+        yearly = share_summary.loc[(scenario_type, region)]
+    else:
+        yearly = share_summary.iloc[:0].droplevel(["Scenario_Type", "Region"])
+    return yearly[(metric, "q25")], yearly[(metric, "median")], yearly[(metric, "q75")]
+
+def metrics_table(cube, metrics):
+    s, r = np.nonzero(metrics["pairs"])
+    table = pd.DataFrame({
+        "Scenario_ID": coded(s, cube.scenarios),
+        "Region": coded(r, cube.regions),
+        "Scenario_Type": coded(cube.scenario_type[s], cube.types),
+    })
+    for col in ["Gas_2020", "Gas_2030", "Total_2030", "Pct_Drop", "Gas_Share_2030"]:
+        table[col] = metrics[col][s, r]
+    return table
+
+def summary_table(keys, values, stats, quantiles, summary="exact", sketch_error=0.01):
+    # Exact grouped summary, or one from mergeable quantile sketches (see scripts/sketch.py)
+    if summary == "exact":
+        return grouped_summary(keys, values, stats=stats, quantiles=quantiles)
+    if summary != "sketch":
+        raise ValueError(f"Unknown summary backend: {summary}")
+    groups = grouped_sketches(keys, values, error=sketch_error)
+    return summarize(groups, list(keys.columns), list(values.columns), stats, quantiles)
+
+def summary_shard(shard, arrays, summary="exact", sketch_error=0.01):
+    # Shard kernel: both summary tables for one region (or region × scenario type), on
+    # the rows gas_share_pivot/metrics_table hold for it, in the same order. Keys are
+    # integer codes, which sort like the labels they stand for.
+    region, stype = shard
+    codes = arrays["scenario_type"]
+    typed = codes >= 0 if stype < 0 else codes == stype
+    s, y = np.nonzero(arrays["keep"][:, region, :] & typed[:, None])
+    gas, total = arrays["gas"][s, region, y], arrays["total"][s, region, y]
+    keys, metrics, stats = SHARE_SUMMARY
+    share_summary = summary_table(
+        pd.DataFrame(dict(zip(keys, [codes[s], np.full(len(s), region), arrays["years"][y]]))),
+        pd.DataFrame(dict(zip(metrics, [100 * gas / total, gas]))),
+        **stats, summary=summary, sketch_error=sketch_error,
+    )
+    s = np.flatnonzero(arrays["pairs"][:, region] & typed)
+    keys, metrics, stats = METRIC_SUMMARY
+    metric_summary = summary_table(
+        pd.DataFrame(dict(zip(keys, [codes[s], np.full(len(s), region)]))),
+        pd.DataFrame({m: arrays[m][s, region] for m in metrics}),
+        **stats, summary=summary, sketch_error=sketch_error,
+    )
+    return share_summary, metric_summary
+
+def labelled(table, cube):
+    # Integer-coded summary index → the cube's labels
+    labels = {"Scenario_Type": cube.types, "Region": cube.regions}
+    index = table.index
+    return table.set_axis(pd.MultiIndex.from_arrays(
+        [labels[n][index.get_level_values(n)] if n in labels else index.get_level_values(n) for n in index.names],
+        names=index.names,
+    ))
+
+def sharded_summaries(cube, keep, total, gas, metrics, workers, shard_by="region", summary="exact", sketch_error=0.01):
+    # Both summary tables from region (or region × scenario type) shards in a process
+    # pool, the cube arrays shared rather than pickled; groups never span shards, so
+    # sorting the concatenated parts gives the serial tables
+    regions = np.flatnonzero(keep.any(axis=(0, 2)) | metrics["pairs"].any(axis=0)).tolist()
+    if shard_by == "region":
+        shards = [(r, -1) for r in regions]
+    elif shard_by == "region_type":
+        shards = [(r, t) for r in regions for t in range(len(cube.types))]
+    else:
+        raise ValueError(f"Unknown shard key: {shard_by}")
+    inputs = {"keep": keep, "total": total, "gas": gas, "scenario_type": cube.scenario_type, "years": cube.years,
+              "pairs": metrics["pairs"], **{m: metrics[m] for m in METRIC_SUMMARY[1]}}
+    _, parts = map_shards(summary_shard, shards, inputs, workers=workers, summary=summary, sketch_error=sketch_error)
+    return tuple(labelled(pd.concat([p[i] for p in parts]).sort_index(), cube) for i in range(2))
 
-            for region, region_df in stype_df.groupby("Region"):
-                sid_years = {}
-                for sid, group in region_df.groupby("Scenario_ID"):
-                    sorted_group = group.sort_values("Year")
-                    below = sorted_group[sorted_group["Gas_Share"] <= th_val]
-                    if not below.empty:
-                        sid_years[sid] = int(below["Year"].iloc[0])  # first year below threshold
-                exit_years_by_scenario[th_name][stype][region] = sid_years
-                exit_years_summary[th_name][stype][region] = int(pd.Series(sid_years.values()).median()) if sid_years else None
+def main(thresholds=None, plots=True, paths_layout="records", paths_precision=2, cube=None, incremental=False,
+         summary="exact", sketch_error=0.01, shard_workers=1, shard_by="region"):
+    # Load data, unless a cube tagged with scenario types is handed over in memory
+    cube = load_inputs() if cube is None else cube
 
+    metrics = scenario_metrics(cube)
+    merged = metrics_table(cube, metrics)
+    df_pivot = gas_share_pivot(cube)
+
+    # Compute gas phase-out years using thresholds: 2.5% (effective), 1.0% (total)
+    thresholds = thresholds or {"effective": 2.5, "total": 1.0}
+    share, keep, total, gas = gas_share_matrix(cube)
+    stypes = ["Low-BECCS", "High-BECCS"]
+    with phase("aggregate"):
+        exit_idx = None
+        if incremental:
+            exit_idx, delta = crossings_incremental(cube, share, thresholds)
+            print(f"🔁 Incremental phase-out years: {changes.describe(delta)}.")
+        exit_years, exit_years_by_scenario, exit_years_summary = phaseout_years(
+            cube, share, keep, thresholds, stypes, exit_idx
+        )
+
+    # --- Summary statistics: one grouped pass per table, shared by every writer below and the plot ---
+    with phase("aggregate"):
+        if shard_workers > 1 and (keep.any() or metrics["pairs"].any()):
+            share_summary, metric_summary = sharded_summaries(
+                cube, keep, total, gas, metrics, shard_workers, shard_by, summary=summary, sketch_error=sketch_error,
+            )
+        else:
+            share_summary, metric_summary = (
+                summary_table(table[keys], table[cols], **stats, summary=summary, sketch_error=sketch_error)
+                for table, (keys, cols, stats) in [(df_pivot, SHARE_SUMMARY), (merged, METRIC_SUMMARY)]
+            )
+        if summary == "sketch":
+            print(f"📐 Summaries from quantile sketches (rank error ≤ {rank_error(k_for_error(sketch_error)):.2%}).")
+        os.makedirs(os.path.dirname(summary_cache), exist_ok=True)
+        pd.to_pickle({"share": share_summary, "metrics": metric_summary}, summary_cache)
 
     # --- Benchmark stats JSON (step5_benchmark_stats.json) ---
     # Group by Scenario_Type AND Region, then summarize
-    def summarize_by_group(group, col):
-        return {
-            "min": group[col].min(),
-            "mean": group[col].mean(),
-            "median": group[col].median(),
-            "max": group[col].max()
-        }
+    def summarize_by_group(row, col):
+        return {stat: row[(col, stat)] for stat in ["min", "mean", "median", "max"]}
 
     # Initialize a nested dictionary for scenario_type -> region -> metrics
     result_by_region = {}
-    for (scenario_type, region), group in merged.groupby(["Scenario_Type", "Region"]):
+    for (scenario_type, region), row in metric_summary.iterrows():
         if scenario_type not in result_by_region:
             result_by_region[scenario_type] = {}
         result_by_region[scenario_type][region] = {
-            "gas_2030_ej": summarize_by_group(group, "Gas_2030"),
-            "pct_drop_2020_2030": summarize_by_group(group, "Pct_Drop"),
-            "gas_share_2030_pct": summarize_by_group(group, "Gas_Share_2030"),
+            "gas_2030_ej": summarize_by_group(row, "Gas_2030"),
+            "pct_drop_2020_2030": summarize_by_group(row, "Pct_Drop"),
+            "gas_share_2030_pct": summarize_by_group(row, "Gas_Share_2030"),
             "gas_phaseout_years": {
                 "effective_2.5pct": exit_years_summary["effective"][scenario_type].get(region),
                 "total_1pct": exit_years_summary["total"][scenario_type].get(region)
             }
         }
 
-    with open(f"{path}step5_benchmark_stats.json", "w") as f:
+    with phase("serialize"), open(f"{path}step5_benchmark_stats.json", "w") as f:
         json.dump(result_by_region, f, indent=2)
 
     # This part is already good: merged_out retains Region column
     merged_out = merged[[ "Scenario_ID", "Region", "Scenario_Type", "Gas_2020", "Gas_2030", "Total_2030", "Pct_Drop", "Gas_Share_2030" ]].copy()
 
-    # Add gas phaseout years
-    def get_phaseout(threshold):
-        def inner(row):
-            return exit_years_by_scenario[threshold] \
-                .get(row["Scenario_Type"], {}) \
-                .get(row["Region"], {}) \
-                .get(row["Scenario_ID"], None)
-        return inner
-
-    merged_out["Effective_Phaseout_Year"] = merged_out.apply(get_phaseout("effective"), axis=1)
-    merged_out["Total_Phaseout_Year"] = merged_out.apply(get_phaseout("total"), axis=1)
-    
-    merged_out.to_csv(f"{path}step5_scenario_gas_stats.csv", index=False)
+    # Add gas phaseout years: gather each (scenario, region) row's first-crossing year
+    s_idx = pd.Index(cube.scenarios).get_indexer(merged_out["Scenario_ID"])
+    r_idx = pd.Index(cube.regions).get_indexer(merged_out["Region"])
+    in_types = merged_out["Scenario_Type"].isin(stypes).to_numpy()
+    for th_name, col in [("effective", "Effective_Phaseout_Year"), ("total", "Total_Phaseout_Year")]:
+        row_years = exit_years[list(thresholds).index(th_name), s_idx, r_idx]
+        found = in_types & (row_years >= 0)
+        # Whole years when every row has one, otherwise float with NaN (as a row-wise apply infers)
+        merged_out[col] = row_years if found.all() else np.where(found, row_years, np.nan)
 
-    # This part is already good: map_summary explicitly groups by Region
-    map_summary = merged.groupby(["Region", "Scenario_Type"]).agg({
-        "Pct_Drop": "median",             # Median % drop from 2020 to 2030
-        "Gas_Share_2030": "median"        # Median gas share in 2030
-    }).reset_index()
+    with phase("serialize"):
+        merged_out.to_csv(f"{path}step5_scenario_gas_stats.csv", index=False)
 
-    # Convert to nested dictionary: Region → Scenario_Type → metrics
+    # Median % drop from 2020 to 2030 and median 2030 gas share, nested Region → Scenario_Type
     region_data = {}
-    for _, row in map_summary.iterrows():
-        region = row["Region"]
-        scenario_type = row["Scenario_Type"]
+    for (region, scenario_type), row in metric_summary.swaplevel().sort_index().iterrows():
         if region not in region_data:
             region_data[region] = {}
         region_data[region][scenario_type] = {
-            "pct_drop": round(row["Pct_Drop"], 2),
-            "gas_share_2030": round(row["Gas_Share_2030"], 2),
+            "pct_drop": round(row[("Pct_Drop", "median")], 2),
+            "gas_share_2030": round(row[("Gas_Share_2030", "median")], 2),
             "gas_phaseout_years": {
                 "effective_2.5pct": exit_years_summary["effective"][scenario_type].get(region),
                 "total_1pct": exit_years_summary["total"][scenario_type].get(region)
@@ -143,22 +303,17 @@ def main():
         }
 
     # Export to JSON
-    with open(f"{path}step5_region_summary.json", "w") as f:
+    with phase("serialize"), open(f"{path}step5_region_summary.json", "w") as f:
         json.dump(region_data, f, indent=2)
 
     # --- Absolute Gas EJ Time Series (step5_gas_timeseries_summary.json) ---
     ej_result = {}
-    gas_data_all_regions = df_pivot.copy() # Contains 'Electricity|Gas' column directly
 
     for scenario_type in ["Low-BECCS", "High-BECCS"]:
         ej_result[scenario_type] = {} # Nested dictionary for regions
-        subset_stype = gas_data_all_regions[gas_data_all_regions["Scenario_Type"] == scenario_type]
 
-        for region_val, group_region in subset_stype.groupby("Region"): # Group by region first
-            grouped = group_region.groupby("Year")["Electricity|Gas"] # Use the pivoted column name
-            median = grouped.median()
-            q25 = grouped.quantile(0.25)
-            q75 = grouped.quantile(0.75)
+        for region_val in summary_regions(share_summary, scenario_type):
+            q25, median, q75 = yearly_stats(share_summary, scenario_type, region_val, "Electricity|Gas")
 
             ej_result[scenario_type][region_val] = { # Store under region key
                 "yearly": [
@@ -179,20 +334,16 @@ def main():
                 )
             }
 
-    with open(f"{path}step5_gas_timeseries_summary.json", "w") as f:
+    with phase("serialize"), open(f"{path}step5_gas_timeseries_summary.json", "w") as f:
         json.dump(ej_result, f, indent=2)
 
     # --- Gas Share Summary (step5_gas_share_summary.json) ---
     result_json = {}
     for scenario_type in ["Low-BECCS", "High-BECCS"]:
         result_json[scenario_type] = {} # Nested dictionary for regions
-        subset_stype = df_pivot[df_pivot["Scenario_Type"] == scenario_type]
 
-        for region_val, group_region in subset_stype.groupby("Region"): # Group by region first
-            grouped = group_region.groupby("Year")["Gas_Share"] # This is correct as Gas_Share is a new column
-            median = grouped.median()
-            q25 = grouped.quantile(0.25)
-            q75 = grouped.quantile(0.75)
+        for region_val in summary_regions(share_summary, scenario_type):
+            q25, median, q75 = yearly_stats(share_summary, scenario_type, region_val, "Gas_Share")
 
             cross_val = median.loc[2030] if 2030 in median.index else None
             cross_year = median[median <= cross_val].index.min() if cross_val is not None else None
@@ -212,197 +363,34 @@ def main():
             }
 
     # Save to JSON
-    with open(f"{path}step5_gas_share_summary.json", "w") as f:
+    with phase("serialize"), open(f"{path}step5_gas_share_summary.json", "w") as f:
         json.dump(result_json, f, indent=2)
 
-    # This part (raw_paths) is already good, it explicitly includes Region
-    raw_paths = []
-    for (sid, region, stype), group in df_pivot.groupby(["Scenario_ID", "Region", "Scenario_Type"]):
-    # Attempt to split Scenario_ID into model and scenario parts
-        if " - " in sid:
-            model, scenario_name = sid.split(" - ", 1)
+    # Raw paths, one per (scenario, region), written straight from the arrays
+    labels = cube.type_labels()
+    with phase("serialize"):
+        if paths_layout == "records":
+            write_path_records(
+                f"{path}step5_gas_share_paths.json",
+                df_pivot["Scenario_ID"].to_numpy(), df_pivot["Region"].to_numpy(), df_pivot["Scenario_Type"].to_numpy(),
+                df_pivot["Year"].to_numpy(), df_pivot["Gas_Share"].to_numpy(), precision=paths_precision,
+            )
+        elif paths_layout == "columnar":
+            s, r = np.nonzero(keep.any(axis=2))
+            write_path_columns(
+                f"{path}step5_gas_share_paths.json",
+                cube.scenarios[s], cube.regions[r], labels[s], cube.years, share[s, r], precision=paths_precision,
+            )
         else:
-            model = "Unknown"
-            scenario_name = sid
-
-        raw_paths.append({
-            "model": model,
-            "scenario": scenario_name,
-            "region": region,
-            "type": stype,
-            "values": [
-                {"year": int(row["Year"]), "value": round(row["Gas_Share"], 2)}
-                for _, row in group.iterrows()
-            ]
-        })
-    with open(f"{path}step5_gas_share_paths.json", "w") as f:
-        json.dump(raw_paths, f, indent=2)
+            raise ValueError(f"Unknown paths layout: {paths_layout}")
 
     
-    with open(f"{path}step5_gas_phaseout_paths.json", "w") as f:
+    with phase("serialize"), open(f"{path}step5_gas_phaseout_paths.json", "w") as f:
         json.dump(exit_years_by_scenario, f, indent=2)
 
-    # --- Time series plotting for ALL Regions (Multiple Plots) ---
-
-    all_regions = sorted(df_pivot["Region"].unique())
-    if "World" in all_regions:
-        all_regions.remove("World")
-        all_regions.insert(0, "World")
-    num_regions = len(all_regions)
-
-    # Determine grid size for subplots
-    cols = 3 # Let's aim for 3 columns per row
-    rows = math.ceil(num_regions / cols)
-
-    # Determine consistent Y-axis limits across all regions
-    # Using a fixed range (0-80%) as per previous discussions to ensure comparability.
-    y_min_global = 0
-    y_max_global = 80
-
-    # Determine consistent X-axis limits
-    x_min_global = df_pivot["Year"].min()
-    x_max_global = df_pivot["Year"].max()
-
-    fig, axs = plt.subplots(rows, cols, figsize=(cols * 6, rows * 5), sharex=True, sharey=True) # sharex/sharey ensures consistent scales
-    axs = axs.flatten() # Flatten the 2D array of axes for easy iteration
-
-    colors = {"Low-BECCS": "blue", "High-BECCS": "red"}
-
-    # Use this to extract handles and labels just once for a single legend
-    legend_handles, legend_labels = [], []
-    collected_labels = set()
-
-    for i, region_to_plot in enumerate(all_regions):
-        ax = axs[i] # Get the current subplot axis
-
-        # Filter data for the current region
-        df_region_plot = df_pivot[df_pivot["Region"] == region_to_plot].copy()
-
-        # Medians at 2030 for the CURRENT region
-        gas_share_2030_region = df_region_plot[df_region_plot["Year"] == 2030]
-        low_beccs_median_region = gas_share_2030_region[gas_share_2030_region["Scenario_Type"] == "Low-BECCS"]["Gas_Share"].median()
-        high_beccs_median_region = gas_share_2030_region[gas_share_2030_region["Scenario_Type"] == "High-BECCS"]["Gas_Share"].median()
-
-        for scenario_type in ["Low-BECCS", "High-BECCS"]:
-            subset_plot_stype = df_region_plot[df_region_plot["Scenario_Type"] == scenario_type].copy()
-
-            # Faint scenario lines for the current region
-            for sid_val in subset_plot_stype["Scenario_ID"].unique():
-                 scenario_group = subset_plot_stype[subset_plot_stype["Scenario_ID"] == sid_val]
-                 ax.plot(scenario_group["Year"], scenario_group["Gas_Share"],
-                         color=colors[scenario_type], alpha=0.05, linewidth=0.5, zorder=1) # zorder to keep lines behind median
-
-            # Group by year for median/IQR bands for the current region
-            grouped_region_plot = subset_plot_stype.groupby("Year")["Gas_Share"]
-            median_region_plot = grouped_region_plot.median()
-            q25_region_plot = grouped_region_plot.quantile(0.25)
-            q75_region_plot = grouped_region_plot.quantile(0.75)
-
-            # Shaded band
-            ax.fill_between(median_region_plot.index, q25_region_plot, q75_region_plot,
-                            color=colors[scenario_type], alpha=0.2, zorder=2)
-
-            # Median line - collect handles for the main legend
-            line, = ax.plot(median_region_plot.index, median_region_plot.values,
-                color=colors[scenario_type], linewidth=2.5, zorder=3)
-
-            # Annotate cross point (using current region's median)
-            cross_val = low_beccs_median_region if scenario_type == "Low-BECCS" else high_beccs_median_region
-
-            if pd.notna(cross_val) and 2030 in median_region_plot.index:
-                y_offset = 7 if scenario_type == "High-BECCS" else -7
-                ax.annotate(
-                    f"{cross_val:.1f}%",
-                    xy=(2030, cross_val),
-                    xytext=(2030 + 4, cross_val + y_offset),
-                    arrowprops=dict(arrowstyle="->", lw=1.2, color=colors[scenario_type]),
-                    fontsize=8,
-                    color=colors[scenario_type],
-                    bbox=dict(boxstyle="round,pad=0.2", fc="white", alpha=0.8, edgecolor=colors[scenario_type]),
-                    zorder=10
-                )
-
-        # Benchmark lines - using current region's medians
-        ax.axvline(2030, color="black", linestyle="--", linewidth=1.5, zorder=0) # Make it thinner
-
-        # Phase-out year lines: effective (2.5%) and total (1.0%) in consistent stacked order
-        phaseout_annotation_order = [
-            ("Low-BECCS", "effective", "-", "Eff", 0),
-            ("Low-BECCS", "total", ":", "Tot", 1),
-            ("High-BECCS", "effective", "-", "Eff", 2),
-            ("High-BECCS", "total", ":", "Tot", 3),
-        ]
-
-        for scenario_type, phase_type, linestyle, label_suffix, stack_idx in phaseout_annotation_order:
-            color = colors[scenario_type]
-            year = exit_years_summary[phase_type][scenario_type].get(region_to_plot)
-            if year is not None and x_min_global <= year <= x_max_global:
-                ax.axvline(year, color=color, linestyle=linestyle, linewidth=1.0, alpha=0.8, zorder=0)
-                vertical_offset = y_max_global - 5 - (stack_idx * 8)  # 8 units apart
-                ax.annotate(
-                    f"{label_suffix}: {year}",
-                    xy=(year, vertical_offset),
-                    xytext=(year + 2, vertical_offset),
-                    textcoords="data",
-                    fontsize=7,
-                    color=color,
-                    arrowprops=dict(arrowstyle="->", lw=0.8, color=color),
-                    bbox=dict(boxstyle="round,pad=0.2", fc="white", edgecolor=color, alpha=0.9),
-                    zorder=10
-                )
-        
-        # Collect benchmark line handles/labels only once for the overall legend
-        if low_beccs_median_region is not None:
-            label_text = f"Low-BECCS 2030 Median ({low_beccs_median_region:.1f}%)"
-            if label_text not in collected_labels:
-                collected_labels.add(label_text)
-            ax.axhline(low_beccs_median_region, color="blue", linestyle="--", linewidth=1.2, zorder=0)
-
-        if high_beccs_median_region is not None:
-            label_text = f"High-BECCS 2030 Median ({high_beccs_median_region:.1f}%)"
-            if label_text not in collected_labels:
-                collected_labels.add(label_text)
-            ax.axhline(high_beccs_median_region, color="red", linestyle="--", linewidth=1.2, zorder=0)
-
-
-        ax.set_title(f"{region_to_plot}", fontsize=12)
-        ax.set_xlabel("Year", fontsize=10)
-        ax.set_ylabel("Gas Share (%)", fontsize=10)
-        ax.grid(True, linestyle=':', alpha=0.7)
-        ax.set_ylim(y_min_global, y_max_global) # Apply consistent Y limits
-        ax.set_xlim(x_min_global, x_max_global) # Apply consistent X limits
-
-
-    # Hide any unused subplots if the number of regions doesn't perfectly fill the grid
-    for j in range(i + 1, len(axs)):
-        fig.delaxes(axs[j])
-
-    # Define dummy lines just once for legend
-    from matplotlib.lines import Line2D
-
-    legend_handles = [
-        Line2D([0], [0], color="blue", linewidth=2.5, label="Low-BECCS Median"),
-        Line2D([0], [0], color="red", linewidth=2.5, label="High-BECCS Median")
-    ]
-    legend_labels = ["Low-BECCS Median", "High-BECCS Median"]   
-
-    # Add a single overall legend at the bottom
-    fig.legend(
-        handles=legend_handles,
-        loc="lower center",
-        bbox_to_anchor=(0.5, 0.01),  # Moved up from -0.05 to be visible
-        ncol=2,                      # Only 2 labels now
-        title="Scenario Type",
-        fontsize=9,
-        title_fontsize=10
-    )
-
-    # Add overall title
-    plt.suptitle("Gas Share in Electricity Over Time by Scenario Type Across Regions", fontsize=16, y=0.98) # Adjust y for suptitle
-
-    plt.tight_layout(rect=[0, 0.08, 1, 0.95]) # Adjust rect to make space for the overall legend and title
-    plt.savefig(output_plot_path, dpi=150)
-    plt.close()
+    if plots:
+        from scripts import plots as diagnostics
+        diagnostics.main(figures=diagnostics.STEP5_FIGURES)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
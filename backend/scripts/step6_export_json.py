@@ -1,9 +1,151 @@
 import pandas as pd
+import filecmp
+import gzip
+import hashlib
 import json
 import os
+import re
 import shutil
 
-def main():
+from scripts.dtypes import CSV_DTYPES
+from scripts.instrument import phase
+
+try:
+    import brotli
+except ImportError:  # optional: only the gzip variants are published without it
+    brotli = None
+
+shard_columns = ["Scenario_ID", "Model", "Scenario", "Variable", "Unit"]
+compressible = (".json", ".csv")
+
+# Files copied to the frontend and published as content-hashed assets
+published_files = [
+    "step6_scenario_table.json",
+    "step6_country_region_map.json",
+    "step5_benchmark_stats.json",
+    "step5_scenario_gas_stats.csv",
+    "step5_region_summary.json",
+    "step5_gas_share_paths.json",
+    "step5_gas_share_summary.json",
+    "step5_gas_timeseries_summary.json",
+    "step3_standardized.csv",
+    "step5_diagnostic1_gas_share_timeseries_all_regions.png",
+    "step3_diagnostics1_timeseries_by_variable.png",
+    "step3_diagnostics2_timeline_heatmap.png",
+    "step3_diagnostics3_model_scenario_histogram.png",
+]
+
+def slug(label):
+    return re.sub(r"[^a-z0-9]+", "-", label.lower()).strip("-")
+
+def write_if_changed(path, text):
+    # Leave files whose content is unchanged untouched, so watchers and dev
+    # servers downstream only see the shards that actually changed
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == text:
+                return False
+    with open(path, "w") as f:
+        f.write(text)
+    return True
+
+def write_shards(df, out_dir):
+    # Split the standardized table into one compact JSON file per (region, variable).
+    # Each series is a single row of its identifying columns plus its values on the
+    # shared year axis; manifest.json indexes the shards so the data page only
+    # fetches the slices a user selects.
+    os.makedirs(out_dir, exist_ok=True)
+
+    years = sorted(df["Year"].unique().tolist())
+    wide = df.pivot_table(
+        index=["Region", "Variable_standardized"] + shard_columns, columns="Year", values="Value", aggfunc="first",
+        observed=True,
+    ).reindex(columns=years)
+
+    shards = []
+    for (region, variable), block in wide.groupby(level=["Region", "Variable_standardized"], sort=True, observed=True):
+        ids = block.index.droplevel(["Region", "Variable_standardized"]).tolist()
+        values = block.to_numpy()
+        rows = [
+            list(key) + [[None if pd.isna(v) else v for v in series]]
+            for key, series in zip(ids, values.tolist())
+        ]
+        fname = f"{slug(region)}__{slug(variable)}.json"
+        write_if_changed(os.path.join(out_dir, fname), json.dumps(
+            {"region": region, "variable": variable, "years": years, "columns": shard_columns, "series": rows},
+            separators=(",", ":"),
+        ))
+        shards.append({
+            "file": fname,
+            "region": region,
+            "variable": variable,
+            "series": len(rows),
+            "rows": int((~pd.isna(values)).sum()),
+            "min": float(pd.Series(values.ravel()).min()),
+            "max": float(pd.Series(values.ravel()).max()),
+        })
+
+    manifest = {
+        "years": years,
+        "columns": shard_columns,
+        "regions": sorted(df["Region"].unique().tolist()),
+        "variables": sorted(df["Variable_standardized"].dropna().unique().tolist()),
+        "shards": shards,
+    }
+    write_if_changed(os.path.join(out_dir, "manifest.json"), json.dumps(manifest, indent=2))
+
+    # Drop shards of regions or variables that no longer exist
+    current = {shard["file"] for shard in shards} | {"manifest.json"}
+    for fname in os.listdir(out_dir):
+        if fname.endswith(".json") and fname not in current:
+            os.remove(os.path.join(out_dir, fname))
+    return manifest
+
+def publish_assets(sources, out_dir, url_prefix="/data/assets/"):
+    # Content-addressed copies of the published files: <name>.<sha256[:12]><ext>,
+    # JSON minified, text files with deterministic .gz (and .br) variants next to
+    # them. A file that already exists under its hash is unchanged and skipped, so
+    # its URL can be cached forever. Returns the asset manifest.
+    os.makedirs(out_dir, exist_ok=True)
+    manifest, written = {}, 0
+    for src in sources:
+        name = os.path.basename(src)
+        stem, ext = os.path.splitext(name)
+        with open(src, "rb") as f:
+            data = f.read()
+        if ext == ".json":
+            data = json.dumps(json.loads(data), separators=(",", ":")).encode()
+        digest = hashlib.sha256(data).hexdigest()
+        fname = f"{stem}.{digest[:12]}{ext}"
+
+        variants = {"identity": (fname, lambda: data)}
+        if ext in compressible:
+            variants["gzip"] = (f"{fname}.gz", lambda: gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                variants["br"] = (f"{fname}.br", lambda: brotli.compress(data, quality=11))
+
+        entry = {"sha256": digest, "encodings": {}}
+        for encoding, (variant, encode) in variants.items():
+            target = os.path.join(out_dir, variant)
+            if not os.path.exists(target):
+                with open(f"{target}.tmp", "wb") as f:
+                    f.write(encode())
+                os.replace(f"{target}.tmp", target)
+                written += 1
+            entry["encodings"][encoding] = {"path": f"{url_prefix}{variant}", "bytes": os.path.getsize(target)}
+        entry["path"] = entry["encodings"].pop("identity")["path"]
+        entry["bytes"] = len(data)
+        manifest[name] = entry
+
+    # Only the current version of each asset is kept
+    current = {os.path.basename(e["path"]) for e in manifest.values()}
+    current |= {os.path.basename(v["path"]) for e in manifest.values() for v in e["encodings"].values()}
+    for fname in os.listdir(out_dir):
+        if fname not in current:
+            os.remove(os.path.join(out_dir, fname))
+    return manifest, written
+
+def main(standardized=None):
     path = "backend/public_data/"
     frontend_data_path = "frontend/public/data/"
     os.makedirs(frontend_data_path, exist_ok=True)
@@ -11,42 +153,54 @@ def main():
     # 1. Scenario Table JSON (from step5_scenario_gas_stats.csv)
     df_table = pd.read_csv(f"{path}step5_scenario_gas_stats.csv")
     table_records = df_table.to_dict(orient="records")
-    with open(f"{path}step6_scenario_table.json", "w") as f:
+    with phase("serialize"), open(f"{path}step6_scenario_table.json", "w") as f:
         json.dump(table_records, f, indent=2)
 
     # 2. Country → Region Map JSON (optional but useful)
     region_map_path = "backend/data/country_region_map.csv"
     if os.path.exists(region_map_path):
         df_region_map = pd.read_csv(region_map_path)[["Country", "Region", "ISO_A3"]]
-        with open(f"{path}step6_country_region_map.json", "w") as f:
+        with phase("serialize"), open(f"{path}step6_country_region_map.json", "w") as f:
             json.dump(df_region_map.to_dict(orient="records"), f, indent=2)
         print("✅ step6_country_region_map.json created.")
     else:
         print(f"⚠️ File not found: {region_map_path}")
 
-    # 3. Copy key JSONs to frontend
-    files_to_copy = [
-        "step6_scenario_table.json",
-        "step6_country_region_map.json",
-        "step5_benchmark_stats.json",
-        "step5_scenario_gas_stats.csv",
-        "step5_region_summary.json",
-        "step5_gas_share_paths.json",
-        "step5_gas_share_summary.json",
-        "step5_gas_timeseries_summary.json",
-        "step3_standardized.csv",
-        "step5_diagnostic1_gas_share_timeseries_all_regions.png",
-        "step3_diagnostics1_timeseries_by_variable.png",
-        "step3_diagnostics2_timeline_heatmap.png",
-        "step3_diagnostics3_model_scenario_histogram.png" 
-    ]
+    # 3. Standardized time series, partitioned by region and variable for the data page
+    #    (handed over directly by the in-memory pipeline, which publishes the full CSV here too)
+    if standardized is None:
+        df_std = pd.read_csv(f"{path}step3_standardized.csv", dtype=CSV_DTYPES, float_precision="round_trip")
+    else:
+        df_std = standardized
+        with phase("serialize"):
+            df_std.to_csv(f"{frontend_data_path}step3_standardized.csv", index=False)
+    with phase("serialize"):
+        manifest = write_shards(df_std, f"{frontend_data_path}shards/standardized/")
+    print(f"✅ {len(manifest['shards'])} standardized data shard(s) written.")
+
+    # 4. Copy key JSONs to frontend
+    files_to_copy = list(published_files)
+
+    if standardized is not None:
+        files_to_copy.remove("step3_standardized.csv")  # written from memory above
 
     for fname in files_to_copy:
         src = os.path.join(path, fname)
         dst = os.path.join(frontend_data_path, fname)
-        if os.path.exists(src):
+        if os.path.exists(src) and not (os.path.exists(dst) and filecmp.cmp(src, dst, shallow=False)):
             shutil.copyfile(src, dst)
 
+    # 5. Content-hashed, precompressed copies plus an asset manifest for long-lived caching
+    with phase("serialize"):
+        published = [os.path.join(frontend_data_path, f) for f in files_to_copy + (
+            ["step3_standardized.csv"] if standardized is not None else []
+        )]
+        assets, written = publish_assets(
+            [p for p in published if os.path.exists(p)], f"{frontend_data_path}assets/"
+        )
+        write_if_changed(f"{frontend_data_path}asset-manifest.json", json.dumps(assets, indent=2, sort_keys=True))
+    print(f"✅ {len(assets)} asset(s) published, {written} new file(s) written.")
+
     print("✅ Step 6 complete. Frontend JSONs updated.")
 
 if __name__ == "__main__":
@@ -0,0 +1,97 @@
+import sqlite3
+
+import pandas as pd
+
+from scripts.instrument import phase
+from scripts.files import file_hash
+
+# Indexed SQLite copy of the step 1–5 tables, for lookups that would otherwise scan
+# a whole CSV (e.g. gas in one region in 2030 for Low-BECCS scenarios). Each table
+# is named after its CSV and reloaded, with bulk inserts in one transaction, only
+# when that CSV changed (every table with force=True, i.e. run.py --force). Every
+# table gets the part of the (Scenario_ID, Region, Variable_standardized, Year) key
+# it has, plus the same key without Scenario_ID for reads across scenarios.
+path = "backend/public_data/"
+db_path = f"{path}step7_scenario_store.sqlite"
+
+TABLES = {
+    "step1_scenario_type": [["Scenario_ID"], ["BECCS_Type", "Scenario_ID"]],
+    "step2_electricity_long": [["Scenario_ID", "Region", "Variable", "Year"], ["Region", "Variable", "Year"]],
+    "step3_standardized": [
+        ["Scenario_ID", "Region", "Variable_standardized", "Year"],
+        ["Region", "Variable_standardized", "Year"],
+    ],
+    "step4_metrics": [["Scenario_ID", "Region", "Variable_standardized"], ["Region", "Variable_standardized"]],
+    "step5_scenario_gas_stats": [["Scenario_ID", "Region"], ["Region", "Scenario_Type"]],
+}
+
+def column_type(dtype):
+    if pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+def quoted(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def load_table(con, table, csv, indexes, digest, chunk_rows=100_000):
+    # Replace one table from its CSV in a single transaction; indexes are built after
+    # the rows are in, which is much faster than maintaining them during the inserts
+    rows = 0
+    con.execute("BEGIN")
+    try:
+        con.execute(f"DROP TABLE IF EXISTS {quoted(table)}")
+        created = False
+        for chunk in pd.read_csv(csv, chunksize=chunk_rows, float_precision="round_trip"):
+            if not created:
+                columns = ", ".join(f"{quoted(c)} {column_type(t)}" for c, t in chunk.dtypes.items())
+                con.execute(f"CREATE TABLE {quoted(table)} ({columns})")
+                insert = f"INSERT INTO {quoted(table)} VALUES ({', '.join('?' * len(chunk.columns))})"
+                created = True
+            # NaN is stored as NULL
+            con.executemany(insert, chunk.itertuples(index=False, name=None))
+            rows += len(chunk)
+        if not created:
+            # Header-only CSV
+            columns = ", ".join(quoted(c) for c in pd.read_csv(csv, nrows=0).columns)
+            con.execute(f"CREATE TABLE {quoted(table)} ({columns})")
+        for cols in indexes:
+            con.execute(f"CREATE INDEX {quoted(table + '__' + '_'.join(cols))} ON {quoted(table)} "
+                        f"({', '.join(quoted(c) for c in cols)})")
+        con.execute("INSERT OR REPLACE INTO _sources VALUES (?, ?, ?, ?)", (table, csv, digest, rows))
+        con.execute("COMMIT")
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    return rows
+
+def main(chunk_rows=100_000, force=False):
+    con = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        con.execute("PRAGMA synchronous = NORMAL")
+        con.execute("CREATE TABLE IF NOT EXISTS _sources "
+                    "(table_name TEXT PRIMARY KEY, source TEXT, sha256 TEXT, rows INTEGER)")
+        loaded = {} if force else dict(con.execute("SELECT table_name, sha256 FROM _sources"))
+
+        reloaded = {}
+        for table, indexes in TABLES.items():
+            csv = f"{path}{table}.csv"
+            digest = file_hash(csv)
+            if digest is None:
+                raise FileNotFoundError(f"{csv} is missing; run steps 1-5 first")
+            if loaded.get(table) == digest:
+                continue
+            with phase("serialize"):
+                reloaded[table] = load_table(con, table, csv, indexes, digest, chunk_rows)
+        if reloaded:
+            # Planner statistics, so filtered reads pick the right index
+            con.execute("ANALYZE")
+    finally:
+        con.close()
+
+    summary = ", ".join(f"{table} ({rows} rows)" for table, rows in reloaded.items()) or "all tables up to date"
+    print(f"✅ step7_scenario_store.sqlite written: {summary}.")
+
+if __name__ == "__main__":
+    main()
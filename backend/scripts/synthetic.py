@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+# Synthetic scenario ensembles shaped like backend/data/scenario_data.xlsx, for
+# benchmarking the pipeline at sizes beyond the bundled 86-scenario workbook.
+# Every knob of the ensemble size is tunable: models, scenarios per model,
+# regions, the year axis and the share of year cells left unreported.
+REGIONS = ["World", "Asia", "Latin America", "Middle East and Africa", "OECD Countries", "Russia and Central Asia"]
+ELECTRICITY = "Secondary Energy|Electricity"
+GAS = "Secondary Energy|Electricity|Gas"
+BECCS = "Carbon Sequestration|CCS|Biomass"
+
+
+def region_names(n):
+    return REGIONS[:n] + [f"Region {i}" for i in range(len(REGIONS), n)]
+
+
+def _blank(values, missing, rng, keep_years=()):
+    # Drop a share of the year cells, but never a series' first value or the
+    # columns other steps index directly
+    mask = rng.random(values.shape) < missing
+    mask[:, 0] = False
+    for j in keep_years:
+        mask[:, j] = False
+    values[mask] = np.nan
+    return values
+
+
+def ensemble(models=21, scenarios=4, regions=6, years=range(2005, 2101, 5), missing=0.1, seed=0):
+    # Returns {"electricity_data": ..., "beccs_deployment": ...} in the workbook's wide layout
+    rng = np.random.default_rng(seed)
+    years = list(years)
+    t = (np.asarray(years) - years[0]) / max(years[-1] - years[0], 1)
+    keep_years = [years.index(y) for y in (2020, 2030, 2050) if y in years]
+
+    ids = pd.DataFrame(
+        [(f"Model {m:02d} 1.0", f"SYN_{m:02d}_{s:04d}") for m in range(models) for s in range(scenarios)],
+        columns=["Model", "Scenario"],
+    )
+    n = len(ids)
+    names = region_names(regions)
+
+    # Total generation grows along a saturating path; the gas share declines to
+    # zero by a per-(scenario, region) phase-out point
+    base = rng.uniform(2, 30, (n, regions))
+    growth = rng.uniform(1.5, 6, (n, regions))
+    total = base[..., None] * (1 + (growth[..., None] - 1) * (1 - np.exp(-3 * t)))
+    share0 = rng.uniform(0.05, 0.4, (n, regions))
+    exit_at = rng.uniform(0.05, 0.9, (n, regions))
+    share = share0[..., None] * np.clip(1 - t / exit_at[..., None], 0, None)
+    gas = total * share
+
+    rows = pd.DataFrame({
+        "Model": np.repeat(ids["Model"].to_numpy(), regions * 2),
+        "Scenario": np.repeat(ids["Scenario"].to_numpy(), regions * 2),
+        "Region": np.tile(np.repeat(names, 2), n),
+        "Variable": np.tile([ELECTRICITY, GAS], n * regions),
+        "Unit": "EJ/yr",
+    })
+    values = np.stack([total, gas], axis=2).reshape(-1, len(years)).round(4)
+    electricity = pd.concat(
+        [rows, pd.DataFrame(_blank(values, missing, rng, keep_years), columns=years)], axis=1
+    )
+
+    # World BECCS deployment ramps up to a 2050 level either side of the step 1 threshold
+    level = rng.uniform(500, 8000, n)
+    ramp = np.clip((np.asarray(years) - 2025) / 25, 0, None)
+    beccs = pd.concat([
+        ids.assign(Region="World", Variable=BECCS, Unit="Mt CO2/yr"),
+        pd.DataFrame(_blank((level[:, None] * ramp).round(4), missing, rng, keep_years), columns=years),
+    ], axis=1)
+
+    return {"electricity_data": electricity, "beccs_deployment": beccs}
+
+
+def write_workbook(path, sheets):
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        pd.DataFrame({"READ ME": ["Synthetic scenario ensemble for benchmarking."]}).to_excel(
+            writer, sheet_name="READ ME", index=False
+        )
+        for name, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=name, index=False)
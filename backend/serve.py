@@ -0,0 +1,85 @@
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from scripts import pipeline
+from scripts.query import QueryError, QueryStore
+
+# Local, offline HTTP service for aggregate queries, e.g.
+#   GET /aggregate?variable=Gas_Share&region=Asia&type=Low-BECCS&start=2020&end=2050&stat=median,q25,q75
+#   GET /meta      → variables, regions, types, years and statistics available
+#   GET /health    → data version and response cache statistics
+# Responses are cached per normalized query (LRU) and carry an ETag, so clients
+# revalidating with If-None-Match get a 304 without a body.
+
+
+def make_handler(store):
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, status, payload, etag=None):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Cache-Control", "no-cache")
+            if etag:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/meta":
+                return self.send_json(200, store.meta())
+            if url.path == "/health":
+                info = store.response.cache_info()
+                return self.send_json(200, {
+                    "version": store.version, "cache": {"hits": info.hits, "misses": info.misses,
+                                                        "size": info.currsize, "max_size": info.maxsize},
+                })
+            if url.path != "/aggregate":
+                return self.send_json(404, {"error": f"Unknown endpoint: {url.path}"})
+            try:
+                key = store.normalize(parse_qs(url.query))
+            except QueryError as e:
+                return self.send_json(400, {"error": str(e)})
+
+            body, etag = store.response(key)
+            if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                return
+            self.send_json(200, body, etag)
+
+        def log_message(self, format, *args):
+            if self.server.verbose:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve aggregate queries over the standardized scenario data locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=256, help="Number of query responses kept (LRU).")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    store = QueryStore.from_workbook(threshold=pipeline.STEPS["step1"]["params"]["threshold"], cache_size=args.cache_size)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(store))
+    server.verbose = args.verbose
+    print(f"🌐 Serving aggregate queries on http://{args.host}:{args.port}/aggregate (data version {store.version})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Query server stopped.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
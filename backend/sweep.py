@@ -0,0 +1,119 @@
+import argparse
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from scripts import ingest, pipeline
+from scripts import step1_filter_beccs as step1
+from scripts import step2_clean_electricity as step2
+from scripts import step3_standardize_timeseries as step3
+from scripts import step5_aggregate_outputs as step5
+from scripts.stats import grouped_summary
+
+# Sensitivity sweep over the BECCS cutoff (step 1) and the gas phase-out
+# thresholds (step 5). The workbook is ingested and interpolated once; every
+# parameter set is then evaluated on the shared scenario cube, with all phase-out
+# thresholds of a BECCS cutoff found in one batched crossing search.
+METRICS = ["Gas_2030", "Pct_Drop", "Gas_Share_2030"]
+
+
+def load(workbook=ingest.workbook_path):
+    beccs = ingest.read_sheet("beccs_deployment", workbook)
+    electricity = ingest.read_sheet("electricity_data", workbook)
+    _, _, cube = step3.standardize(step3.prepare_long(step2.to_long(electricity)))
+    return beccs, cube
+
+
+def param_key(beccs_threshold, effective, total):
+    return f"beccs={beccs_threshold:g},effective={effective:g},total={total:g}"
+
+
+def sweep(beccs, cube, beccs_thresholds, effective, total):
+    # One row per (parameter set, scenario type, region) with the step 5 benchmark medians
+    stypes = ["Low-BECCS", "High-BECCS"]
+    metrics = step5.scenario_metrics(cube)
+    levels = sorted(set(effective) | set(total))
+    level_names = {v: f"{v:g}" for v in levels}
+
+    rows = []
+    for beccs_threshold in beccs_thresholds:
+        cube.with_scenario_types(step1.classify(beccs, beccs_threshold))
+        share, keep, _, _ = step5.gas_share_matrix(cube)
+        _, _, exit_summary = step5.phaseout_years(
+            cube, share, keep, {level_names[v]: v for v in levels}, stypes
+        )
+        merged = step5.metrics_table(cube, metrics)
+        summary = grouped_summary(
+            merged[["Scenario_Type", "Region"]], merged[METRICS], stats=["count", "median"], quantiles=()
+        )
+
+        for (scenario_type, region), row in summary.iterrows():
+            base = {"Scenario_Type": scenario_type, "Region": region, "Scenarios": int(row[("Gas_2030", "count")])}
+            base.update({f"{m}_Median": row[(m, "median")] for m in METRICS})
+            for eff, tot in itertools.product(effective, total):
+                rows.append({
+                    "BECCS_Threshold": beccs_threshold,
+                    "Effective_Threshold": eff,
+                    "Total_Threshold": tot,
+                    **base,
+                    "Effective_Phaseout_Median": exit_summary[level_names[eff]].get(scenario_type, {}).get(region),
+                    "Total_Phaseout_Median": exit_summary[level_names[tot]].get(scenario_type, {}).get(region),
+                })
+
+    table = pd.DataFrame(rows)
+    for col in ["Effective_Phaseout_Median", "Total_Phaseout_Median"]:
+        table[col] = table[col].astype("Int64")
+    return table.sort_values(["BECCS_Threshold", "Effective_Threshold", "Total_Threshold", "Scenario_Type", "Region"],
+                             kind="stable", ignore_index=True)
+
+
+def nested(table):
+    # parameter set → scenario type → region → metrics
+    result = {}
+    for rec in table.to_dict(orient="records"):
+        key = param_key(rec["BECCS_Threshold"], rec["Effective_Threshold"], rec["Total_Threshold"])
+        values = {
+            k: (None if pd.isna(v) else v.item() if isinstance(v, np.generic) else v)
+            for k, v in rec.items() if k not in ("BECCS_Threshold", "Effective_Threshold", "Total_Threshold",
+                                                 "Scenario_Type", "Region")
+        }
+        result.setdefault(key, {}).setdefault(rec["Scenario_Type"], {})[rec["Region"]] = values
+    return result
+
+
+def main():
+    defaults = pipeline.STEPS
+    parser = argparse.ArgumentParser(description="Evaluate every combination of BECCS and gas phase-out thresholds in one run.")
+    parser.add_argument("--beccs", type=float, nargs="+", default=[defaults["step1"]["params"]["threshold"]],
+                        help="BECCS cutoffs in 2050 (MtCO2/yr).")
+    parser.add_argument("--effective", type=float, nargs="+",
+                        default=[defaults["step5"]["params"]["thresholds"]["effective"]],
+                        help="Gas share (%%) counted as effective phase-out.")
+    parser.add_argument("--total", type=float, nargs="+",
+                        default=[defaults["step5"]["params"]["thresholds"]["total"]],
+                        help="Gas share (%%) counted as total phase-out.")
+    parser.add_argument("--output", default=f"{pipeline.CACHE}sweep_sensitivity",
+                        help="Output path without extension; .csv and .json are written.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    beccs, cube = load()
+    loaded = time.perf_counter() - start
+    table = sweep(beccs, cube, args.beccs, args.effective, args.total)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    table.to_csv(f"{args.output}.csv", index=False)
+    with open(f"{args.output}.json", "w") as f:
+        json.dump(nested(table), f, indent=2)
+
+    n_sets = len(args.beccs) * len(args.effective) * len(args.total)
+    print(f"✅ {n_sets} parameter set(s) evaluated in {time.perf_counter() - start:.2f}s "
+          f"(data loaded once in {loaded:.2f}s) → {args.output}.csv/.json")
+
+
+if __name__ == "__main__":
+    main()
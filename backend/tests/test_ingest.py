@@ -0,0 +1,39 @@
+import pandas as pd
+
+from scripts import ingest
+
+
+def wide_rows(*rows):
+    return pd.DataFrame(
+        [{"Model": "M", "Scenario": "S", "Region": "World", "Variable": variable, "Unit": "EJ/yr",
+          2020: v2020, 2030: v2030} for variable, v2020, v2030 in rows]
+    )
+
+
+def test_repeated_key_within_one_source_is_dropped_and_reported():
+    source = wide_rows(
+        ("Secondary Energy|Electricity", 10.0, 12.0),
+        ("Secondary Energy|Electricity|Gas", 2.0, 1.0),
+        ("Secondary Energy|Electricity", 10.0, 15.0),
+    )
+    merged, report = ingest.merge([source], ["a.xlsx"])
+
+    assert merged["Variable"].tolist() == ["Secondary Energy|Electricity", "Secondary Energy|Electricity|Gas"]
+    assert merged.loc[0, 2030] == 12.0
+    assert len(report) == 1
+    assert report[0]["Variable"] == "Secondary Energy|Electricity"
+    assert report[0]["Kept_Source"] == report[0]["Dropped_Source"] == "a.xlsx"
+    assert report[0]["Status"] == "conflict"
+    assert report[0]["Differing_Years"] == 1
+    assert report[0]["Max_Abs_Diff"] == 3.0
+
+
+def test_exact_repeat_in_a_later_source_is_a_duplicate():
+    first = wide_rows(("Secondary Energy|Electricity", 10.0, 12.0))
+    second = wide_rows(("Secondary Energy|Electricity", 10.0, 12.0), ("Secondary Energy|Electricity", 10.0, 12.0))
+    merged, report = ingest.merge([first, second], ["a.xlsx", "b.csv"])
+
+    assert len(merged) == 1
+    assert [(r["Kept_Source"], r["Dropped_Source"], r["Status"]) for r in report] == [
+        ("a.xlsx", "b.csv", "duplicate"), ("a.xlsx", "b.csv", "duplicate"),
+    ]
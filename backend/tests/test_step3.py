@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from scripts import step3_standardize_timeseries as step3
+
+
+def long_rows(region, values):
+    return pd.DataFrame({
+        "Scenario_ID": "M - S", "Model": "M", "Scenario": "S", "Region": region,
+        "Variable": "Secondary Energy|Electricity|Gas", "Unit": "EJ/yr",
+        "Year": list(values), "Value": list(values.values()),
+    })
+
+
+def test_blank_region_row_is_dropped():
+    df = pd.concat([
+        long_rows("World", {2010: 1.0, 2020: 3.0}),
+        long_rows(np.nan, {2015: 99.0}),
+    ], ignore_index=True)
+    standardized, modified, _ = step3.standardize(step3.prepare_long(df))
+
+    assert standardized["Region"].astype(str).unique().tolist() == ["World"]
+    assert len(standardized) == len(step3.all_years)
+    by_year = standardized.set_index("Year")["Value"]
+    assert by_year[2015] == 2.0
+    assert modified == ["M - S"]
@@ -1,7 +1,68 @@
 import type { NextConfig } from "next";
+import { existsSync, readFileSync } from "fs";
+import path from "path";
+
+interface AssetEntry {
+  path: string;
+  encodings?: Record<string, { path: string; bytes: number }>;
+}
+
+const contentTypes: Record<string, string> = {
+  ".json": "application/json; charset=utf-8",
+  ".csv": "text/csv; charset=utf-8",
+};
+
+// Step 6 writes .gz (and .br) variants next to each hashed text asset. Requests
+// for an asset are rewritten to the best variant the client's Accept-Encoding
+// allows (brotli, then gzip), and sent with the matching Content-Encoding. The
+// rules are built from the asset manifest when the server starts.
+function precompressed() {
+  const manifestPath = path.join(__dirname, "public/data/asset-manifest.json");
+  const manifest: Record<string, AssetEntry> = existsSync(manifestPath)
+    ? JSON.parse(readFileSync(manifestPath, "utf-8"))
+    : {};
+  const rewrites = [];
+  const headers = [];
+  for (const entry of Object.values(manifest)) {
+    const encodings = entry.encodings ?? {};
+    const contentType = contentTypes[path.extname(entry.path)];
+    if (!contentType) continue;
+    for (const encoding of ["br", "gzip"].filter(e => e in encodings)) {
+      const accepts = { type: "header" as const, key: "accept-encoding", value: `.*\\b${encoding}\\b.*` };
+      // gzip only when brotli isn't available for this asset or not accepted
+      const when = encoding === "gzip" && "br" in encodings
+        ? { has: [accepts], missing: [{ type: "header" as const, key: "accept-encoding", value: ".*\\bbr\\b.*" }] }
+        : { has: [accepts] };
+      rewrites.push({ source: entry.path, ...when, destination: encodings[encoding].path });
+      headers.push({
+        source: entry.path,
+        ...when,
+        headers: [
+          { key: "Content-Encoding", value: encoding },
+          { key: "Content-Type", value: contentType },
+        ],
+      });
+    }
+    headers.push({ source: entry.path, headers: [{ key: "Vary", value: "Accept-Encoding" }] });
+  }
+  return { rewrites, headers };
+}
 
 const nextConfig: NextConfig = {
-  /* config options here */
+  // Content-hashed data assets published by step 6 never change under the same URL
+  async headers() {
+    return [
+      {
+        source: "/data/assets/:path*",
+        headers: [{ key: "Cache-Control", value: "public, max-age=31536000, immutable" }],
+      },
+      ...precompressed().headers,
+    ];
+  },
+  // Before the public/ files are matched, so the variant is served instead of the plain copy
+  async rewrites() {
+    return { beforeFiles: precompressed().rewrites, afterFiles: [], fallback: [] };
+  },
 };
 
 export default nextConfig;
@@ -1,43 +1,128 @@
 'use client';
 
-import { useEffect, useState } from 'react';
-import Papa from 'papaparse';
+import { useEffect, useRef, useState } from 'react';
 import Navbar from '@/components/Navbar';
 import { useViewportHeight } from '@/lib/useViewportHeight';
+import { assetUrl } from '@/lib/assets';
 
 interface DataRow {
-    Year: string;
+    Year: number;
     Scenario_ID: string;
     Model: string;
     Scenario: string;
     Region: string;
     Variable: string;
     Unit: string;
-    Value: string;
-    Variable_clean: string;
-    Variable_standardized: string;
+    Value: number | null;
 }
 
-const hiddenColumns = ['Variable_clean', 'Variable_standardized'];
+// Index of the per-(region, variable) shards written by step 6
+interface ShardInfo {
+    file: string;
+    region: string;
+    variable: string;
+    series: number;
+    rows: number;
+    min: number;
+    max: number;
+}
+
+interface ShardManifest {
+    years: number[];
+    columns: string[];
+    regions: string[];
+    variables: string[];
+    shards: ShardInfo[];
+}
+
+interface Shard {
+    region: string;
+    variable: string;
+    years: number[];
+    columns: string[];
+    series: [string, string, string, string, string, (number | null)[]][];
+}
+
+const shardBase = '/data/shards/standardized/';
+
+async function fetchJson<T>(url: string): Promise<T> {
+    const res = await fetch(url);
+    if (!res.ok) throw new Error(`${url}: ${res.status} ${res.statusText}`);
+    return res.json();
+}
 
+function shardRows(shard: Shard): DataRow[] {
+    const rows: DataRow[] = [];
+    for (const [Scenario_ID, Model, Scenario, Variable, Unit, values] of shard.series) {
+        shard.years.forEach((Year, i) => {
+            rows.push({ Year, Scenario_ID, Model, Scenario, Region: shard.region, Variable, Unit, Value: values[i] });
+        });
+    }
+    return rows;
+}
 
 export default function DataPage() {
     useViewportHeight();
+    const [manifest, setManifest] = useState<ShardManifest | null>(null);
+    const [regions, setRegions] = useState<string[]>([]);
+    const [variables, setVariables] = useState<string[]>([]);
     const [data, setData] = useState<DataRow[]>([]);
+    const [loading, setLoading] = useState(false);
+    const [error, setError] = useState<string | null>(null);
     const [filter, setFilter] = useState('');
+    const shardCache = useRef(new Map<string, Promise<DataRow[]>>());
+    const csvUrl = assetUrl('step3_standardized.csv');
 
     useEffect(() => {
-        fetch('/data/step3_standardized.csv') // <-- make sure your CSV is here
-            .then(res => res.text())
-            .then(csv => {
-                Papa.parse<DataRow>(csv, {
-                    header: true,
-                    dynamicTyping: true,
-                    complete: (results) => setData(results.data),
-                });
-            });
+        fetchJson<ShardManifest>(`${shardBase}manifest.json`)
+            .then(m => {
+                setManifest(m);
+                setRegions([m.regions.includes('World') ? 'World' : m.regions[0]]);
+                setVariables(m.variables);
+            })
+            .catch(err => setError(`Could not load the data index (${err.message}).`));
     }, []);
 
+    // Fetch only the selected slices; shards already loaded are reused, and a
+    // failed fetch is dropped from the cache so the next selection retries it
+    useEffect(() => {
+        if (!manifest) return;
+        const selected = manifest.shards.filter(s => regions.includes(s.region) && variables.includes(s.variable));
+        let cancelled = false;
+        setLoading(true);
+        setError(null);
+        Promise.all(selected.map(s => {
+            if (!shardCache.current.has(s.file)) {
+                shardCache.current.set(
+                    s.file,
+                    fetchJson<Shard>(`${shardBase}${s.file}`).then(shardRows).catch(err => {
+                        shardCache.current.delete(s.file);
+                        throw err;
+                    })
+                );
+            }
+            return shardCache.current.get(s.file)!;
+        })).then(parts => {
+            if (cancelled) return;
+            setData(parts.flat());
+            setLoading(false);
+        }).catch(err => {
+            if (cancelled) return;
+            setError(`Could not load the selected data (${err.message}).`);
+            setLoading(false);
+        });
+        return () => { cancelled = true; };
+    }, [manifest, regions, variables]);
+
+    const toggle = (list: string[], value: string) =>
+        list.includes(value) ? list.filter(v => v !== value) : [...list, value];
+
+    const selectedRows = manifest
+        ? manifest.shards
+            .filter(s => regions.includes(s.region) && variables.includes(s.variable))
+            .reduce((n, s) => n + s.rows, 0)
+        : 0;
+
     const filteredData = data.filter(row =>
         Object.values(row).some(val =>
             String(val).toLowerCase().includes(filter.toLowerCase())
@@ -71,7 +156,7 @@ export default function DataPage() {
 
                         {/* Download */}
                         <a
-                            href="/data/your-data.csv"
+                            href={csvUrl}
                             download
                             className="bg-[#bfa76f] hover:bg-[#d4bd87] text-black px-4 py-2 rounded-md font-semibold"
                         >
@@ -79,19 +164,44 @@ export default function DataPage() {
                         </a>
                     </div>
 
+                    {/* Slice selection: one shard per region × variable */}
+                    {manifest && (
+                        <div className="mb-6 flex flex-col gap-3 max-w-7xl mx-auto text-sm">
+                            {[
+                                { label: 'Regions', options: manifest.regions, selected: regions, set: setRegions },
+                                { label: 'Variables', options: manifest.variables, selected: variables, set: setVariables },
+                            ].map(({ label, options, selected, set }) => (
+                                <div key={label} className="flex flex-wrap items-center gap-2">
+                                    <span className="text-gray-400 w-20">{label}</span>
+                                    {options.map(option => (
+                                        <button
+                                            key={option}
+                                            onClick={() => set(toggle(selected, option))}
+                                            className={`px-3 py-1 rounded-full border ${selected.includes(option)
+                                                ? 'bg-[#bfa76f] text-black border-[#bfa76f]'
+                                                : 'border-gray-600 text-gray-300 hover:border-gray-400'}`}
+                                        >
+                                            {option}
+                                        </button>
+                                    ))}
+                                </div>
+                            ))}
+                        </div>
+                    )}
+
                     {/* Data Table */}
                     <div className="overflow-auto max-h-[60vh] border border-gray-700 rounded-lg mb-8">
                         <table className="min-w-[1000px] w-full text-sm text-left">
                             <thead className="bg-gray-800 text-gray-300 sticky top-0 z-10">
                                 <tr>
                                     {data[0] &&
-                                        Object.keys(data[0]).filter(key => !hiddenColumns.includes(key)).map((key) => (
+                                        Object.keys(data[0]).map((key) => (
                                             <th key={key} className="py-2 px-3 whitespace-nowrap">{key}</th>
                                         ))}
                                 </tr>
                                 <tr>
                                     {data[0] &&
-                                        Object.keys(data[0]).filter(key => !hiddenColumns.includes(key)).map((key) => {
+                                        Object.keys(data[0]).map((key) => {
                                             const uniqueValues = Array.from(new Set(data.map(row => row[key as keyof DataRow]))).slice(0, 50); // Limit options
                                             return (
                                                 <th key={`${key}-filter`} className="py-1 px-3">
@@ -122,7 +232,6 @@ export default function DataPage() {
                                 {filteredData.slice(0, 100).map((row, idx) => (
                                     <tr key={idx} className="odd:bg-gray-900 even:bg-gray-800">
                                         {Object.entries(row)
-                                            .filter(([key]) => !hiddenColumns.includes(key))
                                             .map(([_, val], i) => (
                                                 <td key={i} className="py-2 px-3 whitespace-nowrap">{String(val)}</td>
                                             ))}
@@ -132,7 +241,11 @@ export default function DataPage() {
                         </table>
                     </div>
                     <p className="text-sm text-gray-400 mt-4 mb-12 text-center">
-                        Showing {filteredData.slice(0, 100).length} of {filteredData.length} rows
+                        {error
+                            ? error
+                            : loading
+                            ? 'Loading selected data...'
+                            : `Showing ${filteredData.slice(0, 100).length} of ${filteredData.length} rows (${selectedRows} in selected slices)`}
                     </p>
                 </section>
             </div>
@@ -2,6 +2,16 @@
 
 import Navbar from '@/components/Navbar';
 import { useViewportHeight } from '@/lib/useViewportHeight';
+import { assetUrl } from '@/lib/assets';
+
+function DiagnosticFigure({ name, caption }: { name: string; caption: string }) {
+  return (
+    <div>
+      <img src={assetUrl(name)} alt={caption} className="w-full rounded-lg shadow" />
+      <p className="text-sm text-gray-400 mt-2 text-center">{caption}</p>
+    </div>
+  );
+}
 
 export default function MethodologyPage() {
   useViewportHeight();
@@ -115,26 +125,23 @@ export default function MethodologyPage() {
               <div className="space-y-8">
                 {[
                   {
-                    img: '/data/step3_diagnostics1_timeseries_by_variable.png',
+                    img: 'step3_diagnostics1_timeseries_by_variable.png',
                     caption: 'Step 3: Electricity & Gas Time Series – Before and After Harmonization',
                   },
                   {
-                    img: '/data/step3_diagnostics2_timeline_heatmap.png',
+                    img: 'step3_diagnostics2_timeline_heatmap.png',
                     caption: 'Step 3: Timeline Heatmap Showing Scenario Coverage by Model',
                   },
                   {
-                    img: '/data/step3_diagnostics3_model_scenario_histogram.png',
+                    img: 'step3_diagnostics3_model_scenario_histogram.png',
                     caption: 'Step 3: Number of Scenarios per Model',
                   },
                   {
-                    img: '/data/step5_diagnostic1_gas_share_timeseries_all_regions.png',
+                    img: 'step5_diagnostic1_gas_share_timeseries_all_regions.png',
                     caption: 'Step 5: Gas Share in Electricity Over Time by Region and Scenario Type',
                   },
                 ].map((fig, i) => (
-                  <div key={i}>
-                    <img src={fig.img} alt={fig.caption} className="w-full rounded-lg shadow" />
-                    <p className="text-sm text-gray-400 mt-2 text-center">{fig.caption}</p>
-                  </div>
+                  <DiagnosticFigure key={i} name={fig.img} caption={fig.caption} />
                 ))}
               </div>
             </div>
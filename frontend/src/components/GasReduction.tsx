@@ -6,6 +6,7 @@ import {
   ResponsiveContainer, ReferenceLine, ReferenceDot
 } from 'recharts';
 import { motion } from "framer-motion";
+import { fetchAsset } from '@/lib/assets';
 
 export default function GasReduction() {
   const [summary, setSummary] = useState<any>(null);
@@ -21,14 +22,14 @@ export default function GasReduction() {
   const totYear = benchmarkWorld?.gas_phaseout_years?.total_1pct;
 
   useEffect(() => {
-    fetch('/data/step5_gas_timeseries_summary.json')
+    fetchAsset('step5_gas_timeseries_summary.json')
       .then(res => res.json())
       .then(data => setSummary(data))
       .catch(err => console.error("Failed to load EJ gas summary:", err));
   }, []);
 
   useEffect(() => {
-    fetch('/data/step5_benchmark_stats.json')
+    fetchAsset('step5_benchmark_stats.json')
       .then(res => res.json())
       .then(data => setBenchmarks(data))
       .catch(err => console.error("Failed to load gas benchmarks:", err));
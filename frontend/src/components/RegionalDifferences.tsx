@@ -6,6 +6,7 @@ import type { AnyLayer } from 'mapbox-gl';
 import { FeatureCollection, Feature } from 'geojson';
 import { LEGEND_COLORS, MAPBOX_COLOR_BUCKETS } from '@/lib/colors';
 import MapLegend from '@/components/MapLegend';
+import { assetUrl, fetchAsset } from '@/lib/assets';
 
 
 // Import Recharts components
@@ -82,8 +83,8 @@ export default function RegionalDifferences() {
     const load = async () => {
       const [geoRes, regionRes, mapRes] = await Promise.all([
         fetch(GEOJSON_URL),
-        fetch('/data/step5_region_summary.json'),
-        fetch('/data/step6_country_region_map.json')
+        fetchAsset('step5_region_summary.json'),
+        fetchAsset('step6_country_region_map.json')
       ]);
 
       const geoJson = await geoRes.json();
@@ -379,7 +380,7 @@ export default function RegionalDifferences() {
             Fossil Gas Share & Phase-Out by Region - A deeper dive
           </h3>
           <img
-            src="/data/step5_diagnostic1_gas_share_timeseries_all_regions.png"
+            src={assetUrl('step5_diagnostic1_gas_share_timeseries_all_regions.png')}
             alt="Gas Share Timeseries by Region"
             className="w-full rounded-lg shadow-lg"
           />
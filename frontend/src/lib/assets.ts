@@ -0,0 +1,22 @@
+// Resolves published data files to their content-hashed URLs via the asset
+// manifest written by step 6, so they can be cached indefinitely. The manifest is
+// bundled at build time, so no request waits on it. Falls back to the plain
+// /data/<name> copy if an entry is missing.
+import manifest from '../../public/data/asset-manifest.json';
+
+interface AssetEntry {
+    path: string;
+    sha256: string;
+    bytes: number;
+    encodings: Record<string, { path: string; bytes: number }>;
+}
+
+const entries: Record<string, AssetEntry> = manifest;
+
+export function assetUrl(name: string): string {
+    return entries[name]?.path ?? `/data/${name}`;
+}
+
+export function fetchAsset(name: string): Promise<Response> {
+    return fetch(assetUrl(name));
+}